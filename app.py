@@ -1,15 +1,52 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, session
+from flask import (Flask, Response, request, render_template, redirect, url_for, flash, session, jsonify,
+                   make_response, stream_with_context)
+from flask.wrappers import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import http_date, is_resource_modified, quote_etag
 from repositories.user_repository import InMemoryUserRepository
 from services.password_service import PasswordService
 from services.auth_service import AuthService
 from services.crypto_service import CryptoService
-from services.file_service import FileService
-from datetime import datetime
-from config import FLASK_SECRET_KEY
+from services.file_service import FileService, UploadRejected
+from services.export_service import ExportService
+from services.search_service import SearchIndex
+from services.reencryption_service import ReencryptionJob
+from services.scrubber_service import IntegrityScrubber
+from services.metrics_service import metrics
+from services.audit_service import AuditLog
+from datetime import datetime, timezone
+from config import (FLASK_SECRET_KEY, HTTP_CACHE_MAX_AGE, METRICS_ENABLED,
+                    REENCRYPT_IO_BUDGET, REENCRYPT_BATCH_SIZE, REENCRYPT_BATCH_PAUSE,
+                    SCRUB_ENABLED, SCRUB_IO_BUDGET, SCRUB_CPU_BUDGET, SCRUB_STALE_AFTER,
+                    SCRUB_INTERVAL, SCRUB_START_DELAY, EXPORT_MAX_FILES, EXPORT_PREFETCH_WORKERS,
+                    EXPORT_PREFETCH_MAX_SIZE, EXPORT_PREFETCH_DEPTH, AUDIT_ENABLED, AUDIT_LOG_FILE,
+                    AUDIT_BUFFER_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_BLOCK_TIMEOUT,
+                    AUDIT_MAX_BYTES, AUDIT_BACKUP_COUNT, MAX_UPLOAD_SIZE, UPLOAD_SPOOL_THRESHOLD,
+                    SEARCH_INDEX_FILE, SEARCH_FLUSH_DELAY, SEARCH_MAX_RESULTS,
+                    SEARCH_MAX_EXTRACT_BYTES, SEARCH_QUEUE_MAX_BYTES, SEARCH_BACKFILL_IO_BUDGET)
+from tempfile import SpooledTemporaryFile
+import atexit
 import os
+import threading
+
+# Запас на заголовки и границы multipart поверх размера самого файла
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadRequest(Request):
+    """Запрос, у которого загружаемые файлы держатся в памяти только до UPLOAD_SPOOL_THRESHOLD байт,
+    а дальше пишутся во временный файл на диске"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD, mode="rb+")
+
 
 app = Flask(__name__)
 app.secret_key = FLASK_SECRET_KEY
+app.request_class = UploadRequest
+# Тело больше лимита werkzeug прерывает на чтении (в том числе без Content-Length)
+if MAX_UPLOAD_SIZE:
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD
 
 # Режим отладки
 DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
@@ -21,12 +58,55 @@ def datetimeformat(value, format='%d.%m.%Y %H:%M'):
         return datetime.fromtimestamp(value).strftime(format)
     return ''
 
+# Метрики включаются до создания сервисов, чтобы учесть и запуск
+metrics.enabled = METRICS_ENABLED
+
 # Инициализация зависимостей
 user_repo = InMemoryUserRepository()
 pwd_service = PasswordService()
 auth_service = AuthService(user_repo, pwd_service)
 crypto_service = CryptoService()
 file_service = FileService(crypto_service)
+search_index = SearchIndex(crypto_service, SEARCH_INDEX_FILE or file_service.upload_folder / ".search_index.bin",
+                           flush_delay=SEARCH_FLUSH_DELAY, max_extract_bytes=SEARCH_MAX_EXTRACT_BYTES,
+                           max_queued_bytes=SEARCH_QUEUE_MAX_BYTES,
+                           backfill_io_budget=SEARCH_BACKFILL_IO_BUDGET)
+file_service.add_listener(search_index.on_storage_event)
+atexit.register(search_index.close)
+export_service = ExportService(file_service,
+                               prefetch_workers=EXPORT_PREFETCH_WORKERS,
+                               prefetch_max_size=EXPORT_PREFETCH_MAX_SIZE,
+                               prefetch_depth=EXPORT_PREFETCH_DEPTH)
+metrics.register_cache('dek', crypto_service.dek_cache)
+metrics.register_cache('listing', file_service.listing_cache)
+scrubber = IntegrityScrubber(file_service,
+                             io_budget=SCRUB_IO_BUDGET,
+                             cpu_budget=SCRUB_CPU_BUDGET,
+                             stale_after=SCRUB_STALE_AFTER,
+                             interval=SCRUB_INTERVAL,
+                             start_delay=SCRUB_START_DELAY)
+if SCRUB_ENABLED:
+    scrubber.start()
+reencryption_job = ReencryptionJob(file_service,
+                                   io_budget=REENCRYPT_IO_BUDGET,
+                                   batch_size=REENCRYPT_BATCH_SIZE,
+                                   batch_pause=REENCRYPT_BATCH_PAUSE)
+
+audit_log = AuditLog(AUDIT_LOG_FILE,
+                     capacity=AUDIT_BUFFER_SIZE,
+                     batch_size=AUDIT_BATCH_SIZE,
+                     flush_interval=AUDIT_FLUSH_INTERVAL,
+                     block_timeout=AUDIT_BLOCK_TIMEOUT,
+                     max_bytes=AUDIT_MAX_BYTES,
+                     backup_count=AUDIT_BACKUP_COUNT,
+                     enabled=AUDIT_ENABLED)
+audit_log.start()
+# При завершении процесса дописываем накопленные события
+atexit.register(audit_log.stop, 5)
+
+def audit(action: str, username: str | None = None, **details) -> None:
+    """Ставит событие в журнал аудита, не дожидаясь записи на диск"""
+    audit_log.record(action, username or session.get('username'), ip=request.remote_addr, **details)
 
 # Создаём демо-пользователей при запуске
 if not user_repo.get_user("admin"):
@@ -34,6 +114,11 @@ if not user_repo.get_user("admin"):
 if not user_repo.get_user("user1"):
     auth_service.create_user("user1", "user123", "user")
 
+# Файлы, загруженные до появления поискового индекса, индексируются в фоне
+threading.Thread(target=search_index.index_stored_files,
+                 args=(file_service, [user.username for user in user_repo.list_users()]),
+                 name="search-backfill", daemon=True).start()
+
 @app.route('/')
 def index():
     return redirect(url_for('login'))
@@ -47,9 +132,11 @@ def login():
         if user:
             session['username'] = user.username
             session['role'] = user.role
+            audit('login', user.username, result='success')
             flash(f"Добро пожаловать, {user.username}!", "success")
             return redirect(url_for('dashboard'))
         else:
+            audit('login', username, result='failure')
             flash("Неверное имя пользователя или пароль.", "error")
     return render_template('login.html')
 
@@ -91,7 +178,11 @@ def admin_panel():
         flash("Доступ запрещён.", "error")
         return redirect(url_for('dashboard'))
     users = user_repo.list_users()
-    return render_template('admin.html', users=users, current_user=session['username'])
+    return render_template('admin.html', users=users, current_user=session['username'],
+                           active_key_id=crypto_service.keyring.active_id,
+                           reencryption=reencryption_job.progress(),
+                           integrity=scrubber.summary(),
+                           corrupted_files=scrubber.corrupted_files())
 
 @app.route('/admin/create', methods=['POST'])
 def admin_create_user():
@@ -100,7 +191,9 @@ def admin_create_user():
     username = request.form['username']
     password = request.form['password']
     role = request.form['role']
-    if auth_service.create_user(username, password, role):
+    created = auth_service.create_user(username, password, role)
+    audit('admin.create_user', target=username, role=role, result='success' if created else 'exists')
+    if created:
         flash(f"Пользователь {username} создан.", "success")
     else:
         flash(f"Пользователь {username} уже существует.", "error")
@@ -111,12 +204,51 @@ def admin_delete_user():
     if session.get('role') != 'admin':
         return redirect(url_for('dashboard'))
     username = request.form['username']
-    if auth_service.remove_user(username, session['username']):
+    removed = auth_service.remove_user(username, session['username'])
+    audit('admin.delete_user', target=username, result='success' if removed else 'refused')
+    if removed:
         flash(f"Пользователь {username} удалён.", "success")
     else:
         flash("Невозможно удалить текущего пользователя.", "error")
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/rotate_key', methods=['POST'])
+def admin_rotate_key():
+    if session.get('role') != 'admin':
+        return redirect(url_for('dashboard'))
+    if reencryption_job.progress()['running']:
+        flash("Перешифрование уже выполняется.", "error")
+        return redirect(url_for('admin_panel'))
+    key_id = crypto_service.rotate_key()
+    reencryption_job.start()
+    audit('admin.rotate_key', key_id=key_id)
+    flash(f"Создан ключ #{key_id}, запущено перешифрование файлов.", "success")
+    return redirect(url_for('admin_panel'))
+
+@app.route('/admin/reencryption')
+def admin_reencryption_status():
+    if session.get('role') != 'admin':
+        return redirect(url_for('dashboard'))
+    return jsonify(reencryption_job.progress())
+
+@app.route('/admin/scrub', methods=['POST'])
+def admin_scrub():
+    if session.get('role') != 'admin':
+        return redirect(url_for('dashboard'))
+    if SCRUB_ENABLED:
+        scrubber.trigger()
+        audit('admin.scrub')
+        flash("Проверка целостности запущена.", "success")
+    else:
+        flash("Фоновая проверка целостности выключена.", "error")
+    return redirect(url_for('admin_panel'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.enabled:
+        return "Метрики выключены", 404
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -125,8 +257,7 @@ def logout():
 
 def get_admin_usernames() -> list[str]:
     """Возвращает список имен пользователей с ролью 'admin'"""
-    all_users = user_repo.list_users()
-    return [user.username for user in all_users if user.role == 'admin']
+    return auth_service.get_admin_usernames()
 
 @app.route('/files')
 def files():
@@ -136,15 +267,23 @@ def files():
     user_role = session.get('role', 'user')
     admin_usernames = get_admin_usernames() if user_role == 'user' else None
     
+    # ETag по версии списка; при непоказанных flash-сообщениях страницу нужно отрисовать заново
+    etag = file_service.listing_version(session['username'], user_role, admin_usernames)
+    if '_flashes' not in session and request.if_none_match.contains(etag):
+        return '', 304, {'ETag': quote_etag(etag), 'Cache-Control': 'private, no-cache'}
+
     user_files = file_service.list_user_files(
         session['username'],
         user_role=user_role,
         admin_usernames=admin_usernames
     )
-    return render_template('files.html', 
-                         username=session['username'],
-                         role=user_role,
-                         files=user_files)
+    response = make_response(render_template('files.html', 
+                                             username=session['username'],
+                                             role=user_role,
+                                             files=user_files))
+    response.headers['ETag'] = quote_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
@@ -154,6 +293,9 @@ def upload_pdf():
     if session.get('role') != 'admin':
         flash("У вас нет прав для загрузки файлов", "error")
         return redirect(url_for('files'))
+    # Отказ по Content-Length до разбора тела запроса
+    if MAX_UPLOAD_SIZE and (request.content_length or 0) > MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD:
+        return upload_too_large()
     if 'pdf' not in request.files:
         flash("Файл не выбран", "error")
         return redirect(url_for('files'))
@@ -161,17 +303,46 @@ def upload_pdf():
     if file.filename == '':
         flash("Файл не выбран", "error")
         return redirect(url_for('files'))
-    if not file.filename.lower().endswith('.pdf'):
+    if not file.filename.lower().endswith('.pdf') or not file_service.looks_like_pdf(file.stream):
+        audit('upload_pdf', file=file.filename, result='not_pdf')
         flash("Только PDF формат", "error")
         return redirect(url_for('files'))
 
     try:
-        filename = file_service.save_pdf(file, session['username'])
+        filename = file_service.save_pdf(file, session['username'], max_size=MAX_UPLOAD_SIZE)
+        audit('upload_pdf', file=filename, result='success')
         flash(f"Файл {filename} загружен и защищён!", "success")
+    except UploadRejected:
+        return upload_too_large()
     except Exception as e:
+        audit('upload_pdf', file=file.filename, result='error')
         flash("Ошибка при загрузке файла", "error")
     return redirect(url_for('files'))
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(error=None):
+    # Сообщение о размере файла и событие аудита - только для загрузки PDF
+    if error is not None and request.endpoint != 'upload_pdf':
+        return error
+    audit('upload_pdf', result='too_large', size=request.content_length)
+    flash(f"Файл слишком большой (максимум {MAX_UPLOAD_SIZE // (1024 * 1024)} МБ)", "error")
+    return redirect(url_for('files'))
+
+@app.route('/delete_pdf/<filename>', methods=['POST'])
+def delete_pdf(filename):
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    if session.get('role') != 'admin':
+        flash("У вас нет прав для удаления файлов", "error")
+        return redirect(url_for('files'))
+    deleted = file_service.delete_pdf(filename, session['username'])
+    audit('delete_pdf', file=filename, result='success' if deleted else 'not_found')
+    if deleted:
+        flash(f"Файл {filename} удалён.", "success")
+    else:
+        flash("Файл не найден", "error")
+    return redirect(url_for('files'))
+
 @app.route('/view_pdf/<filename>')
 def view_pdf(filename):
     if 'username' not in session:
@@ -180,19 +351,88 @@ def view_pdf(filename):
     user_role = session.get('role', 'user')
     admin_usernames = get_admin_usernames() if user_role == 'user' else None
     
-    pdf_data = file_service.load_pdf_for_user(
+    # Условный запрос: ответ 304 без чтения и расшифровки шифротекста
+    validators = file_service.file_validators(filename, session['username'], user_role, admin_usernames)
+    if validators and not_modified(request.environ, validators):
+        audit('view_pdf', file=filename, result='not_modified')
+        return '', 304, cache_headers(validators)
+
+    loaded = file_service.load_pdf_with_validators(
         filename,
         session['username'],
         user_role=user_role,
         admin_usernames=admin_usernames
     )
-    if pdf_data is None:
+    if loaded is None:
+        audit('view_pdf', file=filename, result='not_found')
         flash("Файл не найден или повреждён", "error")
         return redirect(url_for('files'))
-    return pdf_data, 200, {
+    audit('view_pdf', file=filename, result='success')
+    # Валидаторы берутся от отданного файла: первый кандидат мог оказаться повреждённым
+    pdf_data, validators = loaded
+    headers = pdf_headers(filename)
+    headers.update(cache_headers(validators))
+    return pdf_data, 200, headers
+
+@app.route('/search')
+def search():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    query = request.args.get('q', '').strip()
+    user_role = session.get('role', 'user')
+    admin_usernames = get_admin_usernames() if user_role == 'user' else None
+    # Ответ строится только по индексу, документы не расшифровываются
+    results = search_index.search(query, session['username'], user_role=user_role,
+                                  admin_usernames=admin_usernames, limit=SEARCH_MAX_RESULTS) if query else []
+    return render_template('search.html', query=query, role=user_role, results=results)
+
+@app.route('/download_zip', methods=['POST'])
+def download_zip():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    filenames = [name for name in request.form.getlist('filenames') if name]
+    if not filenames:
+        flash("Файлы не выбраны", "error")
+        return redirect(url_for('files'))
+    if len(filenames) > EXPORT_MAX_FILES:
+        flash(f"За один раз можно скачать не более {EXPORT_MAX_FILES} файлов", "error")
+        return redirect(url_for('files'))
+
+    user_role = session.get('role', 'user')
+    admin_usernames = get_admin_usernames() if user_role == 'user' else None
+
+    audit('download_zip', files=filenames)
+    # Архив отдаётся по мере расшифровки документов, длина заранее неизвестна
+    archive = export_service.stream_zip(filenames, session['username'],
+                                        user_role=user_role, admin_usernames=admin_usernames)
+    return Response(stream_with_context(archive), mimetype='application/zip', headers={
+        'Content-Disposition': 'attachment; filename="documents.zip"',
+        'Cache-Control': 'private, no-store',
+    })
+
+def pdf_headers(filename: str) -> dict:
+    """Заголовки ответа с PDF (общие для /view_pdf и ASGI-режима)"""
+    return {
         'Content-Type': 'application/pdf',
         'Content-Disposition': f'inline; filename="{filename}"'
     }
 
+def cache_headers(validators: dict) -> dict:
+    """Заголовки HTTP-кэширования для файла (ETag, Last-Modified, Cache-Control)"""
+    if HTTP_CACHE_MAX_AGE > 0:
+        cache_control = f'private, max-age={HTTP_CACHE_MAX_AGE}'
+    else:
+        cache_control = 'private, no-cache'
+    return {
+        'ETag': quote_etag(validators['etag']),
+        'Last-Modified': http_date(validators['last_modified']),
+        'Cache-Control': cache_control,
+    }
+
+def not_modified(environ: dict, validators: dict) -> bool:
+    """True, если у клиента актуальная копия (If-None-Match / If-Modified-Since)"""
+    last_modified = datetime.fromtimestamp(validators['last_modified'], tz=timezone.utc)
+    return not is_resource_modified(environ, etag=validators['etag'], last_modified=last_modified)
+
 if __name__ == '__main__':
     app.run(debug=DEBUG)
\ No newline at end of file
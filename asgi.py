@@ -0,0 +1,215 @@
+"""ASGI-точка входа.
+
+Запуск: uvicorn asgi:application --workers 1
+
+Просмотр PDF (GET и HEAD /view_pdf/<filename>) обслуживается асинхронно: чтение с диска
+выполняется в пуле потоков ввода-вывода, расшифровка и проверка подписи - в отдельном
+пуле, а тело отправляется порциями без удержания потока на время медленной загрузки.
+Объём расшифрованных данных, одновременно удерживаемых соединениями, ограничен
+ASGI_MAX_INFLIGHT_BYTES: сверх него клиент получает 503 и повторяет запрос позже.
+Все остальные запросы (и ошибки просмотра) передаются Flask-приложению, которое
+выполняется в собственном пуле потоков (ASGI_WSGI_WORKERS).
+"""
+import asyncio
+import inspect
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import parse_cookie
+
+import app as flask_module
+from config import (ASGI_IO_WORKERS, ASGI_CPU_WORKERS, ASGI_WSGI_WORKERS, ASGI_CHUNK_SIZE,
+                    ASGI_MAX_INFLIGHT_BYTES)
+
+VIEW_PDF_PATH = re.compile(r"^/view_pdf/([^/]+)$")
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi, выполняющий WSGI-приложение в пуле потоков.
+    Штатный WsgiToAsgi запускает каждый запрос через sync_to_async(thread_sensitive=True),
+    то есть все запросы по очереди в одном общем потоке: вход с bcrypt или медленный клиент
+    выгрузки архива задерживали бы все остальные маршруты."""
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.executor,
+                                  self.duplicate_header_limit)(scope, receive, send)
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    # Тело run_wsgi_app из asgiref без декоратора sync_to_async
+    _run_wsgi_app = staticmethod(inspect.unwrap(WsgiToAsgiInstance.run_wsgi_app))
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor, duplicate_header_limit: int = 100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class AsyncFileApp:
+    """ASGI-приложение с неблокирующей отдачей PDF"""
+
+    def __init__(self, flask_app, file_service, admin_usernames_provider,
+                 io_workers: int = ASGI_IO_WORKERS, cpu_workers: int = ASGI_CPU_WORKERS,
+                 chunk_size: int = ASGI_CHUNK_SIZE, audit_log=None,
+                 max_inflight_bytes: int = ASGI_MAX_INFLIGHT_BYTES, wsgi_workers: int = ASGI_WSGI_WORKERS):
+        self.flask_app = flask_app
+        self.file_service = file_service
+        self.get_admin_usernames = admin_usernames_provider
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="asgi-io")
+        self.cpu_executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="asgi-cpu")
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_workers, thread_name_prefix="asgi-wsgi")
+        self.fallback = PooledWsgiToAsgi(flask_app, self.wsgi_executor)
+        self.chunk_size = chunk_size
+        self.audit_log = audit_log
+        # Счётчик меняется только в цикле событий, блокировка не нужна
+        self.max_inflight_bytes = max_inflight_bytes
+        self.inflight_bytes = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            match = VIEW_PDF_PATH.match(scope['path'])
+            if match and await self._view_pdf(scope, send, match.group(1)):
+                return
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.io_executor.shutdown(wait=False)
+                self.cpu_executor.shutdown(wait=False)
+                self.wsgi_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _load_session(self, scope) -> dict | None:
+        """Читает подписанную cookie сессии Flask (только чтение, без изменения сессии)"""
+        cookie_header = b"; ".join(
+            value for name, value in scope.get('headers', []) if name == b"cookie"
+        ).decode("latin-1")
+        value = parse_cookie(cookie_header).get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not value:
+            return None
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        if serializer is None:
+            return None
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return serializer.loads(value, max_age=max_age)
+        except Exception:
+            return None
+
+    async def _view_pdf(self, scope, send, filename: str) -> bool:
+        """Отдаёт PDF. Возвращает False, если запрос нужно передать Flask
+        (нет сессии, файл не найден или повреждён - там формируется redirect и flash)."""
+        session = self._load_session(scope)
+        if not session or 'username' not in session:
+            return False
+        user_role = session.get('role', 'user')
+        admin_usernames = self.get_admin_usernames() if user_role == 'user' else None
+
+        loop = asyncio.get_running_loop()
+        validators = await loop.run_in_executor(
+            self.io_executor, self.file_service.file_validators,
+            filename, session['username'], user_role, admin_usernames
+        )
+        if validators and flask_module.not_modified(self._conditional_environ(scope), validators):
+            self._audit(scope, session, filename, 'not_modified')
+            await send({'type': 'http.response.start', 'status': 304,
+                        'headers': self._encode_headers(flask_module.cache_headers(validators))})
+            await send({'type': 'http.response.body', 'body': b""})
+            return True
+
+        # Резерв по размеру шифротекста до чтения; после расшифровки - по фактическому размеру
+        reserved = await loop.run_in_executor(self.io_executor, self._stored_size, validators) if validators else 0
+        if self.inflight_bytes and self.inflight_bytes + reserved > self.max_inflight_bytes:
+            await send({'type': 'http.response.start', 'status': 503,
+                        'headers': [(b"retry-after", b"1"), (b"content-length", b"0")]})
+            await send({'type': 'http.response.body', 'body': b""})
+            return True
+        self.inflight_bytes += reserved
+        try:
+            loaded = await self._load_pdf(filename, session['username'], user_role, admin_usernames)
+            if loaded is None:
+                # Событие запишет Flask при обработке redirect
+                return False
+            pdf_data, validators = loaded
+            self.inflight_bytes += len(pdf_data) - reserved
+            reserved = len(pdf_data)
+            self._audit(scope, session, filename, 'success')
+
+            response_headers = flask_module.pdf_headers(filename)
+            response_headers.update(flask_module.cache_headers(validators))
+            headers = self._encode_headers(response_headers)
+            headers.append((b"content-length", str(len(pdf_data)).encode()))
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            view = memoryview(pdf_data) if scope['method'] == 'GET' else memoryview(b"")
+            for offset in range(0, len(view), self.chunk_size):
+                chunk = view[offset:offset + self.chunk_size]
+                await send({'type': 'http.response.body', 'body': bytes(chunk),
+                            'more_body': offset + self.chunk_size < len(view)})
+            if not view:
+                await send({'type': 'http.response.body', 'body': b""})
+            return True
+        finally:
+            self.inflight_bytes -= reserved
+
+    def _stored_size(self, validators: dict) -> int:
+        try:
+            return os.stat(self.file_service.upload_folder / (validators['safe_name'] + ".enc")).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _audit(self, scope, session: dict, filename: str, result: str) -> None:
+        if self.audit_log is not None:
+            client = scope.get('client')
+            self.audit_log.record('view_pdf', session['username'], ip=client[0] if client else None,
+                                  file=filename, result=result)
+
+    @staticmethod
+    def _encode_headers(headers: dict) -> list[tuple[bytes, bytes]]:
+        return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+    @staticmethod
+    def _conditional_environ(scope) -> dict:
+        """Минимальный WSGI environ с заголовками условного запроса"""
+        environ = {'REQUEST_METHOD': scope['method']}
+        for name, value in scope.get('headers', []):
+            if name in (b"if-none-match", b"if-modified-since"):
+                environ["HTTP_" + name.decode("latin-1").upper().replace("-", "_")] = value.decode("latin-1")
+        return environ
+
+    async def _load_pdf(self, filename, username, user_role, admin_usernames) -> tuple[bytes, dict] | None:
+        """Асинхронный аналог FileService.load_pdf_with_validators"""
+        loop = asyncio.get_running_loop()
+        for safe_name in self.file_service.candidate_names(filename, username, user_role, admin_usernames):
+            stored = await loop.run_in_executor(self.io_executor, self.file_service.read_stored_file, safe_name)
+            if stored is None:
+                continue
+            original_data = await loop.run_in_executor(
+                self.cpu_executor, self.file_service.decode_stored_file, safe_name, *stored
+            )
+            if original_data is not None:
+                validators = await loop.run_in_executor(
+                    self.io_executor, self.file_service.stored_validators, safe_name, stored[1]
+                )
+                return original_data, validators
+        return None
+
+
+application = AsyncFileApp(flask_module.app, flask_module.file_service, flask_module.get_admin_usernames,
+                           audit_log=flask_module.audit_log)
@@ -0,0 +1,46 @@
+"""Бенчмарк аутентификации: пропускная способность AuthService.authenticate.
+
+Запуск:
+    python -m benchmarks.bench_auth [--json results.json]
+"""
+import argparse
+
+from benchmarks.common import measure, print_results, result, write_json
+from repositories.user_repository import InMemoryUserRepository
+from services.auth_service import AuthService
+from services.password_service import PasswordService
+
+
+def run(full: bool = False, repeat: int = 5) -> list[dict]:
+    user_repo = InMemoryUserRepository()
+    auth_service = AuthService(user_repo, PasswordService())
+    auth_service.create_user("student", "correct-password", "user")
+
+    cases = {
+        'authenticate_success': lambda: auth_service.authenticate("student", "correct-password"),
+        'authenticate_wrong_password': lambda: auth_service.authenticate("student", "wrong-password"),
+        'authenticate_unknown_user': lambda: auth_service.authenticate("nobody", "password"),
+    }
+    results = []
+    for name, func in cases.items():
+        # Неизвестный пользователь не доходит до bcrypt, замеряем серией вызовов
+        number = 1000 if name == 'authenticate_unknown_user' else 1
+        results.append(result(name, {}, measure(func, repeat=repeat, number=number)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat)
+    print_results("Аутентификация", results)
+    if args.json:
+        write_json(args.json, 'auth', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
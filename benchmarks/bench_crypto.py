@@ -0,0 +1,82 @@
+"""Микро-бенчмарк AES-GCM: прежний путь (Cipher на каждый вызов), кэшированный AESGCM и шифрование конвертом.
+
+- legacy_*   - прежняя реализация: новый Cipher на каждый вызов
+- cached_*   - шифрование мастер-ключом через кэшированный AESGCM (без конверта)
+- envelope_* - encrypt_symmetric/decrypt_symmetric: новый ключ данных, AESGCM для него
+  и шифрование ключа данных мастер-ключом на каждый файл. Кэш примитива по ключу для
+  шифрования здесь не помогает, поэтому на малых размерах envelope_encrypt медленнее legacy_encrypt;
+  расшифровка использует кэш ключей данных (DEK_CACHE_SIZE)
+
+Запуск:
+    python -m benchmarks.bench_crypto [--sizes 64,4096,...] [--json results.json]
+"""
+import argparse
+import os
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from benchmarks.common import auto_number, measure, print_results, result, write_json
+from services.crypto_service import CryptoService
+
+DEFAULT_SIZES = [64, 1024, 16 * 1024, 256 * 1024, 4 * 1024 * 1024, 64 * 1024 * 1024]
+
+
+def legacy_encrypt(key: bytes, data: bytes) -> bytes:
+    """Прежняя реализация encrypt_symmetric: новый Cipher на каждый вызов"""
+    iv = os.urandom(12)
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(iv)).encryptor()
+    ciphertext = encryptor.update(data) + encryptor.finalize()
+    return iv + encryptor.tag + ciphertext
+
+
+def legacy_decrypt(key: bytes, encrypted_data: bytes) -> bytes:
+    """Прежняя реализация decrypt_symmetric"""
+    iv, tag, ciphertext = encrypted_data[:12], encrypted_data[12:28], encrypted_data[28:]
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(iv, tag)).decryptor()
+    return decryptor.update(ciphertext) + decryptor.finalize()
+
+
+def run(sizes: list[int] | None = None, repeat: int = 5, full: bool = False) -> list[dict]:
+    sizes = sizes or DEFAULT_SIZES
+    crypto = CryptoService()
+    key = crypto.aes_key
+    associated_data = b"admin_lecture.pdf"
+    results = []
+    for size in sizes:
+        data = os.urandom(size)
+        number = auto_number(size)
+        legacy_blob = legacy_encrypt(key, data)
+        cached_blob = memoryview(CryptoService._seal(key, data, associated_data))
+        envelope_blob = crypto.encrypt_symmetric(data, associated_data)
+        cases = {
+            'legacy_encrypt': lambda: legacy_encrypt(key, data),
+            'cached_encrypt': lambda: CryptoService._seal(key, data, associated_data),
+            'envelope_encrypt': lambda: crypto.encrypt_symmetric(data, associated_data),
+            'legacy_decrypt': lambda: legacy_decrypt(key, legacy_blob),
+            'cached_decrypt': lambda: CryptoService._open(key, cached_blob, associated_data),
+            'envelope_decrypt': lambda: crypto.decrypt_symmetric(envelope_blob, associated_data),
+        }
+        for name, func in cases.items():
+            timing = measure(func, repeat=repeat, number=number)
+            results.append(result(name, {'size': size}, timing,
+                                  mb_per_s=round(size / timing['min'] / (1 << 20), 1)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', help="размеры данных в байтах через запятую")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else DEFAULT_SIZES
+    results = run(sizes, repeat=args.repeat)
+    print_results("AES-GCM", results)
+    if args.json:
+        write_json(args.json, 'crypto', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
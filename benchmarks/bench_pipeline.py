@@ -0,0 +1,125 @@
+"""Бенчмарк конвейера файлов: save_pdf / load_pdf_for_user и list_user_files.
+
+Запуск:
+    python -m benchmarks.bench_pipeline [--full] [--json results.json]
+"""
+import argparse
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from benchmarks.common import KB, MB, measure, peak_memory, print_results, result, make_pdf_payload, write_json
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+
+PDF_SIZES = [10 * KB, 100 * KB, 1 * MB, 10 * MB, 50 * MB]
+PDF_SIZES_FULL = PDF_SIZES + [100 * MB, 500 * MB]
+LISTING_FILES = [10, 1_000, 10_000]
+LISTING_FILES_FULL = LISTING_FILES + [100_000]
+LISTING_ADMINS = [1, 50]
+
+
+class _Upload(BytesIO):
+    """Аналог FileStorage для save_pdf"""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+
+
+def _repeat_for(size: int, repeat: int) -> int:
+    # Большие файлы замеряем меньшее число раз
+    return repeat if size <= 10 * MB else max(1, repeat // 3)
+
+
+def bench_save_load(file_service: FileService, sizes: list[int], repeat: int) -> list[dict]:
+    results = []
+    for size in sizes:
+        data = make_pdf_payload(size)
+        runs = _repeat_for(size, repeat)
+
+        def save():
+            return file_service.save_pdf(_Upload(data, "bench.pdf"), "admin")
+
+        def load():
+            return file_service.load_pdf_for_user("bench.pdf", "student", "user", ["admin"])
+
+        save_timing = measure(save, repeat=runs)
+        save_peak = peak_memory(save)
+        assert load() == data
+        load_timing = measure(load, repeat=runs)
+        load_peak = peak_memory(load)
+        stored_size = (file_service.upload_folder / "admin_bench.pdf.enc").stat().st_size
+        results.append(result('save_pdf', {'size': size}, save_timing, peak_bytes=save_peak,
+                              stored_bytes=stored_size, mb_per_s=round(size / save_timing['min'] / MB, 1)))
+        results.append(result('load_pdf_for_user', {'size': size}, load_timing, peak_bytes=load_peak,
+                              mb_per_s=round(size / load_timing['min'] / MB, 1)))
+    return results
+
+
+def bench_listing(upload_folder: Path, file_counts: list[int], admin_counts: list[int], repeat: int) -> list[dict]:
+    """list_user_files для пользователя с ролью 'user' при разном числе файлов и администраторов.
+    Файлы создаются пустыми: list_user_files читает только метаданные."""
+    results = []
+    for admins in admin_counts:
+        admin_usernames = [f"admin{i}" for i in range(admins)]
+        for count in file_counts:
+            folder = upload_folder / f"listing_{admins}_{count}"
+            folder.mkdir()
+            for i in range(count):
+                safe_name = f"{admin_usernames[i % admins]}_doc{i}.pdf"
+                (folder / (safe_name + ".enc")).touch()
+                (folder / (safe_name + ".sig")).touch()
+            file_service = FileService(CryptoService())
+            file_service.upload_folder = folder
+
+            def listing():
+                # Без сброса кэша замерялось бы попадание в кэш списков, а не обход директории
+                file_service.listing_cache.clear()
+                return file_service.list_user_files("student", "user", admin_usernames)
+
+            def cached_listing():
+                return file_service.list_user_files("student", "user", admin_usernames)
+
+            assert len(listing()) == count
+            runs = repeat if count <= 10_000 else max(1, repeat // 3)
+            timing = measure(listing, repeat=runs)
+            results.append(result('list_user_files', {'files': count, 'admins': admins}, timing,
+                                  peak_bytes=peak_memory(listing)))
+            cached_listing()
+            timing = measure(cached_listing, repeat=runs)
+            results.append(result('list_user_files_cached', {'files': count, 'admins': admins}, timing))
+            shutil.rmtree(folder)
+    return results
+
+
+def run(full: bool = False, repeat: int = 5) -> list[dict]:
+    temp_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    try:
+        file_service = FileService(CryptoService())
+        file_service.upload_folder = temp_dir
+        results = bench_save_load(file_service, PDF_SIZES_FULL if full else PDF_SIZES, repeat)
+        results += bench_listing(temp_dir, LISTING_FILES_FULL if full else LISTING_FILES,
+                                 LISTING_ADMINS, repeat)
+        return results
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--full', action='store_true', help="добавить файлы до 500 МБ и 100k файлов в списке")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    results = run(full=args.full, repeat=args.repeat)
+    print_results("Конвейер файлов", results)
+    if args.json:
+        write_json(args.json, 'pipeline', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
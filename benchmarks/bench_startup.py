@@ -0,0 +1,62 @@
+"""Бенчмарк запуска: время `import app` в отдельном процессе.
+
+Запуск:
+    python -m benchmarks.bench_startup [--json results.json]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.common import measure, print_results, project_root, result, write_json
+
+# VmHWM сбрасывается при exec, в отличие от ru_maxrss, который наследует пик родителя после fork
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+try:
+    with open('/proc/self/status') as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss if sys.platform == 'darwin' else rss * 1024
+print(json.dumps({'import_seconds': elapsed, 'max_rss': rss}))
+"""
+
+
+def _probe() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=project_root, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(full: bool = False, repeat: int = 5) -> list[dict]:
+    samples = []
+    process_timing = measure(lambda: samples.append(_probe()), repeat=repeat)
+    import_seconds = sorted(sample['import_seconds'] for sample in samples)
+    import_timing = {'min': import_seconds[0], 'median': import_seconds[len(import_seconds) // 2]}
+    peak = max(sample['max_rss'] for sample in samples)
+    return [
+        result('import_app', {}, import_timing, peak_bytes=peak),
+        result('process_startup', {}, process_timing, peak_bytes=peak),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat)
+    print_results("Запуск приложения", results)
+    if args.json:
+        write_json(args.json, 'startup', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
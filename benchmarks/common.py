@@ -0,0 +1,135 @@
+"""Общие утилиты для бенчмарков"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем корневую директорию в путь (как в tests/conftest.py)
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+KB = 1024
+MB = 1024 * KB
+
+
+def measure(func, repeat: int = 5, number: int = 1) -> dict:
+    """Замеряет время выполнения func: repeat серий по number вызовов.
+    Возвращает время одного вызова в секундах (min/median/mean)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def peak_memory(func) -> int:
+    """Пиковый объём памяти Python-аллокаций (байт) за один вызов func.
+    Замер выполняется отдельно от замера времени: tracemalloc замедляет код."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def max_rss() -> int:
+    """Максимальный RSS процесса в байтах (0, если недоступно)"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def result(name: str, params: dict, timing: dict, **extra) -> dict:
+    """Запись результата в общем для всех наборов формате"""
+    entry = {
+        'name': name,
+        'params': params,
+        'seconds': timing['min'],
+        'median': timing['median'],
+        'ops_per_s': round(1 / timing['min'], 2) if timing['min'] else None,
+    }
+    entry.update(extra)
+    return entry
+
+
+def result_key(entry: dict) -> str:
+    """Ключ для сопоставления результатов разных запусков"""
+    params = ",".join(f"{k}={v}" for k, v in sorted(entry.get('params', {}).items()))
+    return f"{entry['suite']}:{entry['name']}[{params}]"
+
+
+def auto_number(size: int, budget: int = 64 * MB) -> int:
+    """Подбирает число вызовов в серии так, чтобы обработать около budget байт"""
+    return max(1, min(10_000, budget // max(size, 1)))
+
+
+def make_pdf_payload(size: int) -> bytes:
+    """Данные, похожие на PDF по сжимаемости: несжимаемые потоки вперемешку с текстом"""
+    text = b"BT /F1 12 Tf 72 712 Td (Lorem ipsum dolor sit amet) Tj ET\n"
+    block = b"".join(os.urandom(4 * KB) + (text * 80)[:4 * KB] for _ in range(128))
+    header = b"%PDF-1.4\n"
+    body_size = max(size - len(header), 0)
+    repeats, rest = divmod(body_size, len(block))
+    return header + block * repeats + block[:rest]
+
+
+def format_size(size: int) -> str:
+    for unit, factor in (('GB', 1 << 30), ('MB', 1 << 20), ('KB', 1 << 10)):
+        if size >= factor:
+            return f"{size / factor:.3g} {unit}"
+    return f"{size} B"
+
+
+def print_table(title: str, rows: list[dict], columns: list[str]) -> None:
+    """Печатает результаты в виде простой таблицы"""
+    print(f"\n== {title} ==")
+    widths = [max(len(col), *(len(str(row.get(col, ''))) for row in rows)) for col in columns]
+    print("  ".join(col.ljust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(col, '')).ljust(w) for col, w in zip(columns, widths)))
+
+
+def print_results(title: str, results: list[dict]) -> None:
+    """Печатает результаты в формате result()"""
+    rows = []
+    for entry in results:
+        params = ", ".join(
+            f"{k}={format_size(v) if k == 'size' else v}" for k, v in entry.get('params', {}).items()
+        )
+        rows.append({
+            'name': entry['name'],
+            'params': params,
+            'ms': float(f"{entry['seconds'] * 1e3:.4g}"),
+            'ops/s': entry.get('ops_per_s', ''),
+            'peak': format_size(entry['peak_bytes']) if entry.get('peak_bytes') else '',
+        })
+    print_table(title, rows, ['name', 'params', 'ms', 'ops/s', 'peak'])
+
+
+def write_json(path: str, suite: str, results: list[dict]) -> None:
+    """Сохраняет результаты в машиночитаемом виде"""
+    payload = {
+        'suite': suite,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'max_rss': max_rss(),
+        'results': results,
+    }
+    Path(path).write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding='utf-8')
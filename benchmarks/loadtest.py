@@ -0,0 +1,280 @@
+"""Нагрузочный тест приложения: сценарий начала семестра.
+
+Прогоняет реальные маршруты Flask-приложения:
+  1. login    - одновременный вход всех студентов (POST /login)
+  2. files    - просмотр списка файлов (GET /files)
+  3. view     - одновременное открытие одного и того же PDF администратора (GET /view_pdf)
+  4. upload   - массовая загрузка PDF администраторами (POST /upload_pdf)
+
+Пользователи создаются через AuthService.create_user, файлы - через FileService.save_pdf
+(во временной директории). Запросы выполняются через тестовый клиент Flask или по HTTP
+к локальному серверу, запущенному в этом же процессе.
+
+Примеры:
+    python -m benchmarks.loadtest --users 50 --files 200
+    python -m benchmarks.loadtest --mode server --concurrency 32 --json load.json
+"""
+import argparse
+import http.cookiejar
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from benchmarks.common import KB, make_pdf_payload, print_table, write_json
+
+SCENARIOS = ('login', 'files', 'view', 'upload')
+
+
+class _Upload(BytesIO):
+    """Аналог FileStorage для save_pdf"""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+
+
+class FlaskClientSession:
+    """Виртуальный пользователь поверх тестового клиента Flask"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method: str, path: str, data: dict | None = None, files: dict | None = None) -> int:
+        if files:
+            data = dict(data or {})
+            for field, (filename, content) in files.items():
+                data[field] = (BytesIO(content), filename)
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Виртуальный пользователь, работающий с сервером по HTTP (cookie сессии сохраняются)"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method: str, path: str, data: dict | None = None, files: dict | None = None) -> int:
+        body, headers = None, {}
+        if files:
+            body, content_type = self._multipart(data or {}, files)
+            headers['Content-Type'] = content_type
+        elif data:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    @staticmethod
+    def _multipart(data: dict, files: dict) -> tuple[bytes, str]:
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in data.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content) in files.items():
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b"\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n".encode())
+        return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class LoadRecorder:
+    """Собирает задержки и ошибки по маршрутам"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.wall_time = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self) -> list[dict]:
+        rows = []
+        for route, samples in self.latencies.items():
+            samples = sorted(samples)
+            wall = self.wall_time.get(route) or sum(samples)
+            rows.append({
+                'route': route,
+                'requests': len(samples),
+                'errors': self.errors.get(route, 0),
+                'p50_ms': round(percentile(samples, 50) * 1e3, 2),
+                'p95_ms': round(percentile(samples, 95) * 1e3, 2),
+                'p99_ms': round(percentile(samples, 99) * 1e3, 2),
+                'max_ms': round(samples[-1] * 1e3, 2),
+                'rps': round(len(samples) / wall, 1) if wall else None,
+            })
+        return rows
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def run_concurrently(recorder: LoadRecorder, route: str, tasks: list, concurrency: int) -> None:
+    """Выполняет задачи (session, method, path, data, files, expected_status) в пуле потоков"""
+
+    def execute(task):
+        session, method, path, data, files, expected = task
+        start = time.perf_counter()
+        try:
+            status = session.request(method, path, data=data, files=files)
+        except Exception:
+            status = None
+        recorder.record(route, time.perf_counter() - start, status == expected)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(execute, tasks))
+    recorder.wall_time[route] = time.perf_counter() - start
+
+
+def seed(app_module, users: int, admins: int, files: int, file_size: int) -> dict:
+    """Создаёт пользователей и файлы напрямую через сервисы приложения"""
+    students = [(f"lt_student{i}", f"pass{i}") for i in range(users)]
+    admin_accounts = [(f"lt_admin{i}", f"admin{i}") for i in range(admins)]
+    for username, password in students:
+        app_module.auth_service.create_user(username, password, "user")
+    for username, password in admin_accounts:
+        app_module.auth_service.create_user(username, password, "admin")
+
+    payload = make_pdf_payload(file_size)
+    for i in range(files):
+        owner = admin_accounts[i % admins][0]
+        app_module.file_service.save_pdf(_Upload(payload, f"material{i}.pdf"), owner)
+    return {'students': students, 'admins': admin_accounts, 'payload': payload}
+
+
+def run_load(app_module, make_session, users: int, admins: int, files: int, file_size: int,
+             requests_per_user: int, uploads: int, concurrency: int, scenarios=SCENARIOS) -> list[dict]:
+    seeded = seed(app_module, users, admins, files, file_size)
+    recorder = LoadRecorder()
+    student_sessions = [make_session() for _ in seeded['students']]
+    admin_sessions = [make_session() for _ in seeded['admins']]
+
+    # Вход выполняется всегда: остальным сценариям нужны сессии
+    login_tasks = [
+        (session, 'POST', '/login', {'username': username, 'password': password}, None, 302)
+        for session, (username, password) in zip(student_sessions + admin_sessions,
+                                                 seeded['students'] + seeded['admins'])
+    ]
+    run_concurrently(recorder, 'POST /login', login_tasks, concurrency)
+    if 'login' not in scenarios:
+        recorder.latencies.pop('POST /login', None)
+
+    if 'files' in scenarios:
+        tasks = [(session, 'GET', '/files', None, None, 200)
+                 for session in student_sessions for _ in range(requests_per_user)]
+        run_concurrently(recorder, 'GET /files', tasks, concurrency)
+
+    if 'view' in scenarios and files:
+        tasks = [(session, 'GET', '/view_pdf/material0.pdf', None, None, 200)
+                 for session in student_sessions for _ in range(requests_per_user)]
+        run_concurrently(recorder, 'GET /view_pdf', tasks, concurrency)
+
+    if 'upload' in scenarios:
+        tasks = [
+            (admin_sessions[i % admins], 'POST', '/upload_pdf', None,
+             {'pdf': (f"bulk{i}.pdf", seeded['payload'])}, 302)
+            for i in range(uploads)
+        ]
+        run_concurrently(recorder, 'POST /upload_pdf', tasks, concurrency)
+
+    return recorder.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('client', 'server'), default='client',
+                        help="client - тестовый клиент Flask, server - HTTP к локальному серверу")
+    parser.add_argument('--users', type=int, default=20, help="число студентов")
+    parser.add_argument('--admins', type=int, default=2, help="число администраторов")
+    parser.add_argument('--files', type=int, default=50, help="число заранее загруженных PDF")
+    parser.add_argument('--file-size', type=int, default=200 * KB, help="размер PDF в байтах")
+    parser.add_argument('--requests', type=int, default=5, help="запросов /files и /view_pdf на студента")
+    parser.add_argument('--uploads', type=int, default=20, help="число загрузок в сценарии upload")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS))
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    args = parser.parse_args(argv)
+
+    # Журнал аудита, состояние проверки целостности и поисковый индекс синтетических
+    # пользователей и документов не должны попасть в настоящие logs/ и uploads/
+    temp_dir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+    os.environ['AUDIT_LOG_FILE'] = str(temp_dir / "audit.log")
+    os.environ['SEARCH_INDEX_FILE'] = str(temp_dir / ".search_index.bin")
+    os.environ.setdefault('SCRUB_ENABLED', 'false')
+
+    import app as app_module
+
+    app_module.file_service.upload_folder = temp_dir
+    app_module.search_index.path = temp_dir / ".search_index.bin"
+    app_module.scrubber.state_path = temp_dir / ".scrub_state.json"
+    server = None
+    try:
+        if args.mode == 'server':
+            from werkzeug.serving import make_server
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+            make_session = lambda: HttpSession(base_url)
+        else:
+            make_session = lambda: FlaskClientSession(app_module.app)
+
+        rows = run_load(app_module, make_session, args.users, max(1, args.admins), args.files,
+                        args.file_size, args.requests, args.uploads, args.concurrency,
+                        scenarios=tuple(s.strip() for s in args.scenarios.split(",")))
+    finally:
+        if server is not None:
+            server.shutdown()
+        app_module.search_index.close()
+        app_module.scrubber.stop(timeout=5)
+        app_module.audit_log.stop(timeout=5)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print_table(f"Нагрузочный тест ({args.mode})", rows,
+                ['route', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'rps'])
+    if args.json:
+        write_json(args.json, 'loadtest', rows)
+    return rows
+
+
+if __name__ == '__main__':
+    main()
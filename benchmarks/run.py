@@ -0,0 +1,78 @@
+"""Запуск всех бенчмарков с сохранением и сравнением результатов.
+
+Примеры:
+    python -m benchmarks.run --json baseline.json
+    python -m benchmarks.run --json current.json --compare baseline.json
+    python -m benchmarks.run --suite pipeline,auth --full
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from benchmarks import bench_auth, bench_crypto, bench_pipeline, bench_startup
+from benchmarks.common import print_results, print_table, result_key, write_json
+
+SUITES = {
+    'crypto': (bench_crypto, "AES-GCM"),
+    'pipeline': (bench_pipeline, "Конвейер файлов"),
+    'auth': (bench_auth, "Аутентификация"),
+    'startup': (bench_startup, "Запуск приложения"),
+}
+
+
+def compare(current: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """Сравнивает результаты по времени. Возвращает строки отчёта и помечает регрессии"""
+    baseline_by_key = {result_key(entry): entry for entry in baseline}
+    rows = []
+    for entry in current:
+        key = result_key(entry)
+        previous = baseline_by_key.get(key)
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = entry['seconds'] / previous['seconds']
+        rows.append({
+            'benchmark': key,
+            'baseline_ms': float(f"{previous['seconds'] * 1e3:.4g}"),
+            'current_ms': float(f"{entry['seconds'] * 1e3:.4g}"),
+            'change': f"{(ratio - 1) * 100:+.1f}%",
+            'status': 'REGRESSION' if ratio > 1 + threshold else ('faster' if ratio < 1 - threshold else 'ok'),
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suite', default=",".join(SUITES), help="наборы через запятую: " + ", ".join(SUITES))
+    parser.add_argument('--full', action='store_true', help="полные размеры данных (до 500 МБ, 100k файлов)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="путь для сохранения результатов в JSON")
+    parser.add_argument('--compare', help="JSON с результатами предыдущего запуска")
+    parser.add_argument('--threshold', type=float, default=0.10, help="допустимое замедление (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.suite.split(","):
+        module, title = SUITES[name.strip()]
+        suite_results = module.run(full=args.full, repeat=args.repeat)
+        for entry in suite_results:
+            entry['suite'] = name.strip()
+        print_results(title, suite_results)
+        results.extend(suite_results)
+
+    if args.json:
+        write_json(args.json, 'all', results)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))['results']
+        rows = compare(results, baseline, args.threshold)
+        if rows:
+            print_table("Сравнение с " + args.compare, rows,
+                        ['benchmark', 'baseline_ms', 'current_ms', 'change', 'status'])
+        if any(row['status'] == 'REGRESSION' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
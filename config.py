@@ -14,6 +14,13 @@ AES_KEY_FILE = KEYS_DIR / "aes_key.bin"
 RSA_PRIVATE_KEY_FILE = KEYS_DIR / "rsa_private_key.pem"
 RSA_PUBLIC_KEY_FILE = KEYS_DIR / "rsa_public_key.pem"
 
+# Связка AES ключей для ротации: <key_id>.bin + файл с идентификатором активного ключа.
+# Ключ из aes_key.bin всегда доступен под идентификатором 0
+AES_KEYRING_DIR = KEYS_DIR / "aes_keyring"
+
+# Количество расшифрованных ключей данных файлов, которые держим в памяти (LRU)
+DEK_CACHE_SIZE = int(os.getenv('DEK_CACHE_SIZE', '1024'))
+
 
 def get_or_create_aes_key() -> bytes:
     """Получает AES ключ из файла или создает новый"""
@@ -74,3 +81,75 @@ RSA_PRIVATE_KEY, RSA_PUBLIC_KEY = get_or_create_rsa_keys()
 FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
 if not FLASK_SECRET_KEY:
     FLASK_SECRET_KEY = 'change-this-in-production-secret-key-dev-only'
+
+# Метрики в формате Prometheus на /metrics (по умолчанию выключены)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+
+# HTTP-кэширование /view_pdf: max-age в секундах для Cache-Control: private.
+# 0 - браузер хранит копию, но перепроверяет её (условный запрос, ответ 304)
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '0'))
+
+# Фоновое перешифрование хранилища после ротации ключа
+# Бюджет ввода-вывода в байтах в секунду (0 - без ограничения)
+REENCRYPT_IO_BUDGET = int(os.getenv('REENCRYPT_IO_BUDGET', str(8 * 1024 * 1024)))
+# Количество файлов в одной партии и пауза между партиями (секунды)
+REENCRYPT_BATCH_SIZE = int(os.getenv('REENCRYPT_BATCH_SIZE', '50'))
+REENCRYPT_BATCH_PAUSE = float(os.getenv('REENCRYPT_BATCH_PAUSE', '0.1'))
+
+# Фоновая проверка целостности файлов (расшифровка + проверка подписи)
+SCRUB_ENABLED = os.getenv('SCRUB_ENABLED', 'True').lower() == 'true'
+# Бюджет ввода-вывода (байт/с, 0 - без ограничения) и доля процессорного времени (0..1]
+SCRUB_IO_BUDGET = int(os.getenv('SCRUB_IO_BUDGET', str(4 * 1024 * 1024)))
+SCRUB_CPU_BUDGET = float(os.getenv('SCRUB_CPU_BUDGET', '0.25'))
+# Неизменённый файл перепроверяется, если последняя проверка старше SCRUB_STALE_AFTER секунд
+SCRUB_STALE_AFTER = float(os.getenv('SCRUB_STALE_AFTER', str(7 * 24 * 3600)))
+# Интервал между проходами и задержка первого прохода после запуска (секунды)
+SCRUB_INTERVAL = float(os.getenv('SCRUB_INTERVAL', '3600'))
+SCRUB_START_DELAY = float(os.getenv('SCRUB_START_DELAY', '60'))
+
+# Ограничения загрузки PDF: максимальный размер файла и порог, начиная с которого
+# загружаемый файл записывается во временный файл на диске, а не держится в памяти
+# (у werkzeug по умолчанию 500 КБ)
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(50 * 1024 * 1024)))
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', str(256 * 1024)))
+
+# Журнал аудита (входы, загрузки, просмотры, действия администраторов):
+# файл JSON Lines с ротацией по размеру, размер буфера в памяти, размер пачки и период записи,
+# сколько запрос может ждать места в заполненном буфере, прежде чем событие будет отброшено
+AUDIT_ENABLED = os.getenv('AUDIT_ENABLED', 'True').lower() == 'true'
+AUDIT_LOG_FILE = Path(os.getenv('AUDIT_LOG_FILE', str(Path(__file__).parent / "logs" / "audit.log")))
+AUDIT_BUFFER_SIZE = int(os.getenv('AUDIT_BUFFER_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))
+AUDIT_BLOCK_TIMEOUT = float(os.getenv('AUDIT_BLOCK_TIMEOUT', '0.05'))
+AUDIT_MAX_BYTES = int(os.getenv('AUDIT_MAX_BYTES', str(10 * 1024 * 1024)))
+AUDIT_BACKUP_COUNT = int(os.getenv('AUDIT_BACKUP_COUNT', '10'))
+
+# Выгрузка нескольких PDF одним ZIP-архивом: максимум файлов в архиве,
+# потоки предварительной расшифровки, размер "небольшого" файла и глубина опережения
+EXPORT_MAX_FILES = int(os.getenv('EXPORT_MAX_FILES', '200'))
+EXPORT_PREFETCH_WORKERS = int(os.getenv('EXPORT_PREFETCH_WORKERS', '4'))
+EXPORT_PREFETCH_MAX_SIZE = int(os.getenv('EXPORT_PREFETCH_MAX_SIZE', str(1024 * 1024)))
+EXPORT_PREFETCH_DEPTH = int(os.getenv('EXPORT_PREFETCH_DEPTH', '8'))
+
+# Полнотекстовый поиск: файл зашифрованного индекса (по умолчанию uploads/.search_index.bin),
+# задержка записи индекса на диск после изменений (0 - сразу), максимальное число результатов,
+# сколько байт распакованных потоков PDF разбирать в одном документе и сколько байт PDF может
+# ждать индексации в очереди
+SEARCH_INDEX_FILE = os.getenv('SEARCH_INDEX_FILE', '')
+SEARCH_FLUSH_DELAY = float(os.getenv('SEARCH_FLUSH_DELAY', '2.0'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '50'))
+SEARCH_MAX_EXTRACT_BYTES = int(os.getenv('SEARCH_MAX_EXTRACT_BYTES', str(16 * 1024 * 1024)))
+SEARCH_QUEUE_MAX_BYTES = int(os.getenv('SEARCH_QUEUE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Скорость чтения хранилища (байт/с) при сверке индекса с файлами после запуска; 0 - без ограничения
+SEARCH_BACKFILL_IO_BUDGET = int(os.getenv('SEARCH_BACKFILL_IO_BUDGET', str(4 * 1024 * 1024)))
+
+# ASGI-режим (asgi.py): пулы потоков для чтения с диска, для криптографии и для
+# маршрутов Flask, размер порции, которой тело PDF отправляется клиенту
+ASGI_IO_WORKERS = int(os.getenv('ASGI_IO_WORKERS', '32'))
+ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', '32'))
+ASGI_CPU_WORKERS = int(os.getenv('ASGI_CPU_WORKERS', str(os.cpu_count() or 1)))
+ASGI_CHUNK_SIZE = int(os.getenv('ASGI_CHUNK_SIZE', str(256 * 1024)))
+# Сколько байт расшифрованных PDF могут одновременно держать в памяти соединения;
+# сверх этого /view_pdf отвечает 503 с Retry-After
+ASGI_MAX_INFLIGHT_BYTES = int(os.getenv('ASGI_MAX_INFLIGHT_BYTES', str(512 * 1024 * 1024)))
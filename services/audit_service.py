@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from services.metrics_service import AUDIT_EVENTS_TOTAL, AUDIT_FLUSH_SECONDS
+
+
+class AuditLog:
+    """Журнал аудита: события складываются в кольцевой буфер в памяти,
+    фоновый поток пишет их пачками в файл JSON Lines (только дозапись, fsync на пачку, ротация по размеру).
+    При заполненном буфере запись ждёт не дольше block_timeout, после чего событие отбрасывается и учитывается."""
+
+    def __init__(self, path: Path, capacity: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, block_timeout: float = 0.05,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 10, enabled: bool = True):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = enabled
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._written = 0
+        self._batches = 0
+        self._dropped = 0
+        # Отброшенные с момента последней записи: попадают в журнал отдельной строкой
+        self._unreported_drops = 0
+
+    def record(self, action: str, username: str | None = None, **details) -> bool:
+        """Ставит событие в очередь. Возвращает False, если событие отброшено"""
+        if not self.enabled:
+            return False
+        event = {'ts': time.time(), 'action': action, 'user': username, **details}
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                # Обратное давление: будим писателя и ждём освобождения места
+                self._cond.notify_all()
+                deadline = time.monotonic() + self.block_timeout
+                while len(self._buffer) >= self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                if len(self._buffer) >= self.capacity:
+                    self._dropped += 1
+                    self._unreported_drops += 1
+                    AUDIT_EVENTS_TOTAL.inc(result='dropped')
+                    return False
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def start(self) -> None:
+        """Запускает фоновую запись"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Останавливает фоновую запись и дописывает оставшиеся события"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def flush(self) -> int:
+        """Синхронно записывает все накопленные события. Возвращает число записанных"""
+        written = 0
+        while True:
+            count = self._write_batch()
+            if not count:
+                return written
+            written += count
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'pending': len(self._buffer),
+                'written': self._written,
+                'batches': self._batches,
+                'dropped': self._dropped,
+            }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                while self._write_batch() >= self.batch_size:
+                    pass
+            except OSError:
+                # Диск недоступен: события остаются в буфере, повторим на следующем цикле
+                self._stop.wait(self.flush_interval)
+
+    def _take_batch(self) -> tuple[list, int]:
+        with self._cond:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            drops, self._unreported_drops = self._unreported_drops, 0
+            # Освободилось место: будим ожидающих в record
+            self._cond.notify_all()
+        return batch, drops
+
+    def _write_batch(self) -> int:
+        with self._write_lock:
+            batch, drops = self._take_batch()
+            if not batch and not drops:
+                return 0
+            lines = [self._format(event) for event in batch]
+            if drops:
+                lines.append(self._format({'ts': time.time(), 'action': 'audit.dropped', 'user': None, 'count': drops}))
+            payload = "".join(lines).encode('utf-8')
+            try:
+                with AUDIT_FLUSH_SECONDS.time():
+                    self._rotate_if_needed(len(payload))
+                    handle = self._open()
+                    handle.write(payload)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            except OSError:
+                self._requeue(batch, drops)
+                raise
+            with self._cond:
+                self._written += len(batch)
+                self._batches += 1
+            AUDIT_EVENTS_TOTAL.inc(len(batch), result='written')
+            return len(batch)
+
+    def _requeue(self, batch: list, drops: int) -> None:
+        with self._cond:
+            self._buffer.extendleft(reversed(batch))
+            self._unreported_drops += drops
+
+    @staticmethod
+    def _format(event: dict) -> str:
+        event = dict(event, ts=datetime.fromtimestamp(event['ts'], tz=timezone.utc).isoformat())
+        return json.dumps(event, ensure_ascii=False) + "\n"
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        """audit.log -> audit.log.1 -> ... -> audit.log.<backup_count>, самый старый удаляется"""
+        if self.max_bytes <= 0 or self.backup_count <= 0:
+            return
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
@@ -1,3 +1,4 @@
+import threading
 from models.users import User
 from repositories.user_repository import UserRepository
 from services.password_service import PasswordService
@@ -6,6 +7,11 @@ class AuthService:
     def __init__(self, user_repo: UserRepository, pwd_service: PasswordService):
         self.user_repo = user_repo
         self.pwd_service = pwd_service
+        # Кэш имён администраторов, сбрасывается при создании и удалении пользователей.
+        # Поколение не даёт сохранить список, собранный до изменения пользователей
+        self._admin_usernames = None
+        self._admin_generation = 0
+        self._admin_lock = threading.Lock()
 
     def authenticate(self, username: str, password: str) -> User | None:
         user = self.user_repo.get_user(username)
@@ -19,9 +25,30 @@ class AuthService:
         pwd_hash = self.pwd_service.hash_password(password)
         user = User(username=username, password_hash=pwd_hash, role=role)
         self.user_repo.save_user(user)
+        self._invalidate_admins()
         return True
 
     def remove_user(self, username: str, current_user: str) -> bool:
         if username == current_user:
             return False
-        return self.user_repo.delete_user(username)
\ No newline at end of file
+        deleted = self.user_repo.delete_user(username)
+        if deleted:
+            self._invalidate_admins()
+        return deleted
+
+    def _invalidate_admins(self) -> None:
+        with self._admin_lock:
+            self._admin_generation += 1
+            self._admin_usernames = None
+
+    def get_admin_usernames(self) -> list[str]:
+        """Возвращает список имен пользователей с ролью 'admin'"""
+        admin_usernames = self._admin_usernames
+        if admin_usernames is None:
+            generation = self._admin_generation
+            admin_usernames = [user.username for user in self.user_repo.list_users() if user.role == 'admin']
+            with self._admin_lock:
+                # Пока собирали список, пользователей могли изменить - тогда не кэшируем
+                if generation == self._admin_generation:
+                    self._admin_usernames = admin_usernames
+        return list(admin_usernames)
\ No newline at end of file
@@ -1,32 +1,268 @@
 # services/crypto_service.py
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
+from functools import lru_cache
+from pathlib import Path
 import gzip
 import os
-from config import AES_KEY, RSA_PRIVATE_KEY, RSA_PUBLIC_KEY
+import struct
+import threading
+from config import AES_KEY, AES_KEYRING_DIR, DEK_CACHE_SIZE, RSA_PRIVATE_KEY, RSA_PUBLIC_KEY
+from services.cache import LRUCache
+
+# Небольшие данные шифруются кэшированным AESGCM; для больших выгоднее потоковый Cipher,
+# которому не нужно склеивать CIPHERTEXT и TAG в отдельный буфер
+FAST_PATH_MAX_SIZE = 128 * 1024
+GCM_IV_SIZE = 12
+GCM_TAG_SIZE = 16
+
+# Заголовок шифротекста: MAGIC + версия формата + идентификатор мастер-ключа.
+# Версия 1: данные зашифрованы мастер-ключом напрямую.
+# Версия 2 (конверт): за заголовком следует ключ данных файла, зашифрованный мастер-ключом,
+# сами данные зашифрованы ключом данных. При смене мастер-ключа переписывается только заголовок.
+# Данные без заголовка (старый формат) зашифрованы ключом с идентификатором 0
+KEY_HEADER_MAGIC = b"VSUK"
+KEY_HEADER_VERSION = 1
+ENVELOPE_VERSION = 2
+_KEY_HEADER = struct.Struct(">4sBI")
+KEY_HEADER_SIZE = _KEY_HEADER.size
+DATA_KEY_SIZE = 32
+WRAPPED_KEY_SIZE = GCM_IV_SIZE + GCM_TAG_SIZE + DATA_KEY_SIZE
+ENVELOPE_HEADER_SIZE = KEY_HEADER_SIZE + WRAPPED_KEY_SIZE
+LEGACY_KEY_ID = 0
+
+
+@lru_cache(maxsize=16)
+def _get_aesgcm(key: bytes) -> AESGCM:
+    """Кэширует примитив AESGCM для ключа, чтобы не создавать его на каждый вызов"""
+    return AESGCM(key)
+
+
+class KeyRing:
+    """Связка AES ключей с идентификаторами. Новые данные шифруются активным ключом,
+    старые расшифровываются ключом, идентификатор которого записан в заголовке."""
+    ACTIVE_FILE = "active"
+
+    def __init__(self, keys: dict[int, bytes], active_id: int = LEGACY_KEY_ID, directory: Path | None = None):
+        self._keys = dict(keys)
+        self.active_id = active_id
+        self.directory = directory  # None - ключи только в памяти
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: Path, legacy_key: bytes) -> "KeyRing":
+        """Загружает связку ключей из директории"""
+        directory.mkdir(exist_ok=True)
+        keyring = cls({LEGACY_KEY_ID: legacy_key}, LEGACY_KEY_ID, directory)
+        keyring.reload()
+        return keyring
+
+    def reload(self) -> None:
+        """Перечитывает ключи с диска (например, после ротации в другом процессе)"""
+        if self.directory is None:
+            return
+        with self._lock:
+            for key_file in self.directory.glob("*.bin"):
+                self._keys[int(key_file.stem)] = key_file.read_bytes()
+            active_file = self.directory / self.ACTIVE_FILE
+            if active_file.exists():
+                self.active_id = int(active_file.read_text().strip())
+
+    def get(self, key_id: int) -> bytes:
+        """Возвращает ключ по идентификатору"""
+        if key_id not in self._keys:
+            self.reload()
+        return self._keys[key_id]
+
+    @property
+    def active_key(self) -> bytes:
+        return self.get(self.active_id)
+
+    def ids(self) -> list[int]:
+        return sorted(self._keys)
+
+    def rotate(self) -> int:
+        """Создаёт новый ключ и делает его активным. Возвращает его идентификатор"""
+        with self._lock:
+            key_id = max(self._keys) + 1
+            key = os.urandom(32)
+            if self.directory is not None:
+                # Ключ должен оказаться на диске раньше, чем им зашифрован хоть один заголовок:
+                # иначе после сбоя питания файлы ссылались бы на пустой или отсутствующий ключ
+                self._write_durably(f"{key_id}.bin", key)
+                self._write_durably(self.ACTIVE_FILE, str(key_id).encode())
+            self._keys[key_id] = key
+            self.active_id = key_id
+            return key_id
+
+    def _write_durably(self, name: str, data: bytes) -> None:
+        """Атомарно записывает файл связки: временный файл, fsync, os.replace и fsync каталога"""
+        tmp_path = self.directory / (name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / name)
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return  # на Windows каталог так не открыть
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
 
 class CryptoService:
-    def __init__(self):
-        self.aes_key = AES_KEY
+    def __init__(self, keyring: KeyRing | None = None, dek_cache_size: int = DEK_CACHE_SIZE):
+        self.keyring = keyring or KeyRing.load(AES_KEYRING_DIR, AES_KEY)
         self.rsa_private = RSA_PRIVATE_KEY
         self.rsa_public = RSA_PUBLIC_KEY
+        # Расшифрованные ключи данных часто открываемых файлов
+        self.dek_cache = LRUCache(dek_cache_size)
+
+    @property
+    def aes_key(self) -> bytes:
+        """Активный AES мастер-ключ"""
+        return self.keyring.active_key
 
-    def encrypt_symmetric(self, data: bytes) -> bytes:
-        """AES-GCM шифрование (автоматически генерирует IV)"""
-        iv = os.urandom(12)
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.GCM(iv))
+    def encrypt_symmetric(self, data: bytes, associated_data: bytes | None = None) -> bytes:
+        """AES-GCM шифрование конвертом: случайный ключ данных + его копия,
+        зашифрованная активным мастер-ключом. associated_data не шифруется,
+        но аутентифицируется вместе с данными."""
+        associated_data = associated_data or b""
+        data_key = AESGCM.generate_key(bit_length=DATA_KEY_SIZE * 8)
+        header = self._wrap_data_key(data_key, self.keyring.active_id, associated_data)
+        aesgcm = AESGCM(data_key)
+        self.dek_cache.put(header + associated_data, (data_key, aesgcm))
+        return self._seal(data_key, data, self._body_associated_data(associated_data), header, aesgcm)
+
+    def decrypt_symmetric(self, encrypted_data: bytes, associated_data: bytes | None = None) -> bytes:
+        """Расшифровка AES-GCM ключом, указанным в заголовке.
+        Повреждённые данные с корректным заголовком дают InvalidTag после одной попытки."""
+        associated_data = associated_data or b""
+        version, key_id = self._parse_header(encrypted_data)
+        try:
+            if version == ENVELOPE_VERSION:
+                data_key, aesgcm = self._unwrap_data_key(encrypted_data[:ENVELOPE_HEADER_SIZE], associated_data)
+                return self._open(data_key, memoryview(encrypted_data)[ENVELOPE_HEADER_SIZE:],
+                                  self._body_associated_data(associated_data), aesgcm)
+            if version == KEY_HEADER_VERSION:
+                key = self.keyring.get(key_id)
+                return self._open(key, memoryview(encrypted_data)[KEY_HEADER_SIZE:],
+                                  encrypted_data[:KEY_HEADER_SIZE] + associated_data)
+        except KeyError:
+            pass  # неизвестный ключ: IV файла старого формата случайно совпал с заголовком
+        return self._open(self.keyring.get(LEGACY_KEY_ID), memoryview(encrypted_data), associated_data)
+
+    def header_matches(self, encrypted_data: bytes, associated_data: bytes | None = None) -> bool:
+        """True, если ключ данных конверта расшифровывается с этими associated data.
+        Проверяется только заголовок, поэтому так дёшево отличить повреждённое тело файла
+        от данных, зашифрованных с другими associated data."""
+        if not self.is_envelope(encrypted_data):
+            return False
+        try:
+            self._unwrap_data_key(encrypted_data[:ENVELOPE_HEADER_SIZE], associated_data or b"")
+        except (InvalidTag, KeyError):
+            return False
+        return True
+
+    def key_id_of(self, encrypted_data: bytes) -> int:
+        """Идентификатор мастер-ключа, которым защищены данные"""
+        _, key_id = self._parse_header(encrypted_data)
+        return LEGACY_KEY_ID if key_id is None else key_id
+
+    def is_envelope(self, encrypted_data: bytes) -> bool:
+        """True, если данные зашифрованы конвертом (мастер-ключ можно сменить через rewrap_header)"""
+        return self._parse_header(encrypted_data)[0] == ENVELOPE_VERSION
+
+    def needs_reencryption(self, encrypted_data: bytes) -> bool:
+        """True, если данные защищены не активным ключом или записаны в старом формате"""
+        version, key_id = self._parse_header(encrypted_data)
+        return version != ENVELOPE_VERSION or key_id != self.keyring.active_id
+
+    def rewrap_header(self, header: bytes, associated_data: bytes | None = None) -> bytes:
+        """Перешифровывает ключ данных активным мастер-ключом.
+        Возвращает новый заголовок того же размера (ENVELOPE_HEADER_SIZE)."""
+        associated_data = associated_data or b""
+        data_key, _ = self._unwrap_data_key(header[:ENVELOPE_HEADER_SIZE], associated_data)
+        return self._wrap_data_key(data_key, self.keyring.active_id, associated_data)
+
+    def rotate_key(self) -> int:
+        """Ротация AES мастер-ключа: новые ключи данных шифруются новым ключом"""
+        return self.keyring.rotate()
+
+    @staticmethod
+    def _body_associated_data(associated_data: bytes) -> bytes:
+        # Данные не привязаны к мастер-ключу, чтобы смена ключа не требовала их перешифрования
+        return KEY_HEADER_MAGIC + bytes([ENVELOPE_VERSION]) + associated_data
+
+    def _wrap_data_key(self, data_key: bytes, key_id: int, associated_data: bytes) -> bytes:
+        prefix = _KEY_HEADER.pack(KEY_HEADER_MAGIC, ENVELOPE_VERSION, key_id)
+        return self._seal(self.keyring.get(key_id), data_key, prefix + associated_data, prefix)
+
+    def _unwrap_data_key(self, header: bytes, associated_data: bytes) -> tuple[bytes, AESGCM]:
+        """Расшифровывает ключ данных из заголовка (с кэшированием)"""
+        cache_key = bytes(header) + associated_data
+        cached = self.dek_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        _, _, key_id = _KEY_HEADER.unpack_from(header)
+        data_key = self._open(self.keyring.get(key_id), memoryview(header)[KEY_HEADER_SIZE:],
+                              header[:KEY_HEADER_SIZE] + associated_data)
+        entry = (data_key, AESGCM(data_key))
+        self.dek_cache.put(cache_key, entry)
+        return entry
+
+    @staticmethod
+    def _parse_header(encrypted_data: bytes) -> tuple[int | None, int | None]:
+        """Возвращает (версия формата, идентификатор ключа) или (None, None) для старого формата"""
+        if len(encrypted_data) < KEY_HEADER_SIZE:
+            return None, None
+        magic, version, key_id = _KEY_HEADER.unpack_from(encrypted_data)
+        if magic != KEY_HEADER_MAGIC:
+            return None, None
+        header_size = {KEY_HEADER_VERSION: KEY_HEADER_SIZE, ENVELOPE_VERSION: ENVELOPE_HEADER_SIZE}.get(version)
+        if header_size is None or len(encrypted_data) < header_size + GCM_IV_SIZE + GCM_TAG_SIZE:
+            return None, None
+        return version, key_id
+
+    @staticmethod
+    def _seal(key: bytes, data: bytes, associated_data: bytes | None, prefix: bytes = b"",
+              aesgcm: AESGCM | None = None) -> bytes:
+        """Шифрует данные, возвращает PREFIX + IV + TAG + CIPHERTEXT"""
+        iv = os.urandom(GCM_IV_SIZE)
+        if len(data) <= FAST_PATH_MAX_SIZE:
+            # AESGCM возвращает CIPHERTEXT + TAG, переставляем в формат хранилища
+            aesgcm = aesgcm or _get_aesgcm(key)
+            sealed = memoryview(aesgcm.encrypt(iv, data, associated_data))
+            return b"".join((prefix, iv, sealed[-GCM_TAG_SIZE:], sealed[:-GCM_TAG_SIZE]))
+        cipher = Cipher(algorithms.AES(key), modes.GCM(iv))
         encryptor = cipher.encryptor()
+        if associated_data:
+            encryptor.authenticate_additional_data(associated_data)
         ciphertext = encryptor.update(data) + encryptor.finalize()
-        return iv + encryptor.tag + ciphertext  # IV + TAG + CIPHERTEXT
-
-    def decrypt_symmetric(self, encrypted_data: bytes) -> bytes:
-        """Расшифровка AES-GCM"""
-        iv = encrypted_data[:12]
-        tag = encrypted_data[12:28]
-        ciphertext = encrypted_data[28:]
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.GCM(iv, tag))
+        return b"".join((prefix, iv, encryptor.tag, ciphertext))
+
+    @staticmethod
+    def _open(key: bytes, sealed: memoryview, associated_data: bytes | None,
+              aesgcm: AESGCM | None = None) -> bytes:
+        """Расшифровывает IV + TAG + CIPHERTEXT"""
+        iv = bytes(sealed[:GCM_IV_SIZE])
+        tag = bytes(sealed[GCM_IV_SIZE:GCM_IV_SIZE + GCM_TAG_SIZE])
+        ciphertext = sealed[GCM_IV_SIZE + GCM_TAG_SIZE:]
+        if len(ciphertext) <= FAST_PATH_MAX_SIZE:
+            aesgcm = aesgcm or _get_aesgcm(key)
+            return aesgcm.decrypt(iv, bytes(ciphertext) + tag, associated_data)
+        cipher = Cipher(algorithms.AES(key), modes.GCM(iv, tag))
         decryptor = cipher.decryptor()
+        if associated_data:
+            decryptor.authenticate_additional_data(associated_data)
         return decryptor.update(ciphertext) + decryptor.finalize()
 
     def sign_data(self, data: bytes) -> bytes:
@@ -54,4 +290,4 @@ class CryptoService:
         return gzip.compress(data)
 
     def decompress(self, compressed_data: bytes) -> bytes:
-        return gzip.decompress(compressed_data)
\ No newline at end of file
+        return gzip.decompress(compressed_data)
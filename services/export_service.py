@@ -0,0 +1,129 @@
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from services.file_service import FileService
+
+# Порция, которой содержимое документа пишется в архив
+ZIP_CHUNK_SIZE = 256 * 1024
+
+
+class _StreamBuffer:
+    """Несикаемый поток для zipfile: накапливает записанные байты до следующей выдачи клиенту"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ExportService:
+    """Потоковая выгрузка нескольких PDF одним ZIP-архивом.
+    Документы расшифровываются и проверяются по одному, архив целиком в памяти не собирается.
+    Небольшие документы расшифровываются заранее в пуле потоков, пока отправляются предыдущие."""
+
+    def __init__(self, file_service: FileService, prefetch_workers: int = 4,
+                 prefetch_max_size: int = 1024 * 1024, prefetch_depth: int = 8):
+        self.file_service = file_service
+        self.prefetch_max_size = prefetch_max_size
+        self.prefetch_depth = prefetch_depth
+        self.executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="zip-export")
+
+    def _locate(self, filename: str, username: str, user_role: str, admin_usernames: list) -> tuple[str, int] | None:
+        """Первый существующий файл хранилища для filename и размер его шифротекста"""
+        for safe_name in self.file_service.candidate_names(filename, username, user_role, admin_usernames):
+            try:
+                return safe_name, (self.file_service.upload_folder / (safe_name + ".enc")).stat().st_size
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _load(self, filename: str, username: str, user_role: str, admin_usernames: list) -> tuple[bytes, float] | None:
+        """Расшифровывает и проверяет документ с теми же правилами доступа, что и load_pdf_for_user.
+        Возвращает (содержимое, дата изменения) или None."""
+        for safe_name in self.file_service.candidate_names(filename, username, user_role, admin_usernames):
+            stored = self.file_service.read_stored_file(safe_name)
+            if stored is None:
+                continue
+            original_data = self.file_service.decode_stored_file(safe_name, *stored)
+            if original_data is not None:
+                try:
+                    modified = (self.file_service.upload_folder / (safe_name + ".enc")).stat().st_mtime
+                except FileNotFoundError:
+                    modified = datetime.now().timestamp()
+                return original_data, modified
+        return None
+
+    def stream_zip(self, filenames: list[str], username: str, user_role: str = None,
+                   admin_usernames: list = None):
+        """Генератор порций ZIP-архива с указанными документами.
+        Недоступные или повреждённые документы, а также имена с путями или недопустимыми символами
+        (их нет в хранилище, где имена проходят secure_filename, как в save_pdf) пропускаются
+        и перечисляются в _missing.txt."""
+        requested = list(dict.fromkeys(filenames))
+        filenames = [name for name in requested if name and secure_filename(name) == name]
+        accepted = set(filenames)
+        rejected = [name for name in requested if name not in accepted]
+        small = {}
+        for index, filename in enumerate(filenames):
+            located = self._locate(filename, username, user_role, admin_usernames)
+            small[index] = located is not None and located[1] <= self.prefetch_max_size
+
+        prefetched = {}
+        pending = deque(index for index in range(len(filenames)) if small[index])
+
+        def schedule(current: int) -> None:
+            # Держим в работе не больше prefetch_depth небольших документов впереди текущего
+            while pending and pending[0] < current + self.prefetch_depth:
+                index = pending.popleft()
+                if index >= current:
+                    prefetched[index] = self.executor.submit(
+                        self._load, filenames[index], username, user_role, admin_usernames
+                    )
+
+        buffer = _StreamBuffer()
+        missing = list(rejected)
+        try:
+            with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for index, filename in enumerate(filenames):
+                    schedule(index)
+                    future = prefetched.pop(index, None)
+                    loaded = future.result() if future else self._load(filename, username, user_role, admin_usernames)
+                    if loaded is None:
+                        missing.append(filename)
+                        continue
+                    data, modified = loaded
+                    info = zipfile.ZipInfo(filename, date_time=datetime.fromtimestamp(modified).timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    with archive.open(info, mode="w", force_zip64=len(data) >= zipfile.ZIP64_LIMIT) as entry:
+                        view = memoryview(data)
+                        for offset in range(0, len(view), ZIP_CHUNK_SIZE):
+                            entry.write(view[offset:offset + ZIP_CHUNK_SIZE])
+                            yield buffer.drain()
+                    del data, view, loaded
+                    yield buffer.drain()
+                if missing:
+                    # Имена пришли из формы: переводы строк не должны разрывать список
+                    lines = (" ".join(name.splitlines()) for name in missing)
+                    archive.writestr("_missing.txt", "\n".join(lines) + "\n")
+            yield buffer.drain()
+        finally:
+            # Клиент мог оборвать загрузку: отменяем ещё не начатую расшифровку
+            for future in prefetched.values():
+                future.cancel()
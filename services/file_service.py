@@ -1,77 +1,390 @@
+import hashlib
+import os
+import threading
 from pathlib import Path
+from cryptography.exceptions import InvalidTag
 from werkzeug.utils import secure_filename
-from services.crypto_service import CryptoService
+from services.crypto_service import CryptoService, ENVELOPE_HEADER_SIZE, GCM_IV_SIZE, GCM_TAG_SIZE
+from services.cache import LRUCache
+from services.metrics_service import FILE_STAGE_SECONDS
 
 BASE_DIR = Path(__file__).parent.parent
 UPLOAD_FOLDER = BASE_DIR / "uploads"
 UPLOAD_FOLDER.mkdir(exist_ok=True)
 
+# Число закэшированных списков файлов (пользователь + набор администраторов)
+LISTING_CACHE_SIZE = 4096
+
+# Размер начала файла, по которому определяется ключ шифрования (заголовок конверта + IV + TAG)
+REKEY_PROBE_SIZE = ENVELOPE_HEADER_SIZE + GCM_IV_SIZE + GCM_TAG_SIZE
+
+# Копия прежнего заголовка на время его перезаписи на месте: <safe_name>.enc.rekey
+REKEY_JOURNAL_SUFFIX = ".enc.rekey"
+
+# Число блокировок, между которыми распределяются файлы хранилища (по хешу имени)
+FILE_LOCK_STRIPES = 64
+
+# Сигнатура PDF; по спецификации может стоять не в самом начале, а в первых 1024 байтах
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+
+class UploadRejected(ValueError):
+    """Загружаемый файл отклонён до обработки (слишком большой или не PDF)"""
+
+
 class FileService:
     def __init__(self, crypto_service: CryptoService):
         self.crypto = crypto_service
         self.upload_folder = UPLOAD_FOLDER
+        # Версии списков файлов по владельцам (для ETag страницы /files).
+        # Токен запуска отличает версии разных запусков процесса
+        self._owner_versions = {}
+        self._versions_lock = threading.Lock()
+        self._boot_token = os.urandom(8).hex()
+        # Готовые списки файлов: запись действительна, пока не изменилась версия списка
+        self.listing_cache = LRUCache(LISTING_CACHE_SIZE)
+        # Подписчики на события хранилища: callback(event, owner, safe_name, **payload)
+        self._listeners = []
+        # Чтение .enc и перезапись заголовка на месте не пересекаются для одного файла
+        self._file_locks = [threading.Lock() for _ in range(FILE_LOCK_STRIPES)]
+        self.recover_interrupted_rekeys()
 
-    def save_pdf(self, file, username: str) -> str:
-        """Сохраняет PDF, шифрует его, сжимает, подписывает"""
+    def save_pdf(self, file, username: str, max_size: int = 0) -> str:
+        """Сохраняет PDF, шифрует его, сжимает, подписывает.
+        max_size - ограничение размера загрузки (0 - без ограничения), при превышении UploadRejected"""
         filename = secure_filename(file.filename)
-        original_data = file.read()
+        if max_size:
+            # Читаем не больше лимита + 1 байт: слишком большой файл целиком в память не попадает
+            original_data = file.read(max_size + 1)
+        else:
+            original_data = file.read()
+        if max_size and len(original_data) > max_size:
+            raise UploadRejected(f"Файл больше {max_size} байт")
+        safe_name = f"{username}_{filename}"
 
         # 1. Сжатие
-        compressed = self.crypto.compress(original_data)
-        # 2. Шифрование
-        encrypted = self.crypto.encrypt_symmetric(compressed)
+        with FILE_STAGE_SECONDS.time(stage="compress"):
+            compressed = self.crypto.compress(original_data)
+        # 2. Шифрование (шифротекст привязан к владельцу и имени файла)
+        with FILE_STAGE_SECONDS.time(stage="encrypt"):
+            encrypted = self.crypto.encrypt_symmetric(compressed, self._associated_data(safe_name))
         # 3. Подпись хеша исходных данных
-        signature = self.crypto.sign_data(original_data)
+        with FILE_STAGE_SECONDS.time(stage="sign"):
+            signature = self.crypto.sign_data(original_data)
 
         # Сохраняем зашифрованный файл + подпись отдельно
-        safe_name = f"{username}_{filename}"
         enc_path = self.upload_folder / (safe_name + ".enc")
         sig_path = self.upload_folder / (safe_name + ".sig")
-        with open(enc_path, "wb") as f:
-            f.write(encrypted)
-        with open(sig_path, "wb") as f:
-            f.write(signature)
+        with FILE_STAGE_SECONDS.time(stage="write"):
+            self._write_atomic(enc_path, encrypted)
+            self._write_atomic(sig_path, signature)
+        self._publish("saved", username, safe_name, data=original_data)
 
         return safe_name
 
-    def load_pdf_for_user(self, filename: str, username: str, user_role: str = None, admin_usernames: list = None) -> bytes | None:
-        """Расшифровывает, проверяет подпись, возвращает PDF.
-        Если user_role == 'user', также проверяет файлы администраторов."""
+    @staticmethod
+    def looks_like_pdf(stream) -> bool:
+        """Проверяет сигнатуру PDF в начале потока и возвращает позицию чтения на место"""
+        position = stream.tell()
+        head = stream.read(PDF_MAGIC_WINDOW)
+        stream.seek(position)
+        return PDF_MAGIC in head
+
+    def delete_pdf(self, filename: str, username: str) -> bool:
+        """Удаляет файл пользователя. Возвращает False, если файла нет"""
+        safe_name = f"{username}_{secure_filename(filename)}"
+        deleted = False
+        for ext in (".enc", ".sig"):
+            try:
+                (self.upload_folder / (safe_name + ext)).unlink()
+                deleted = True
+            except FileNotFoundError:
+                pass
+        if deleted:
+            self._publish("deleted", username, safe_name)
+        return deleted
+
+    def add_listener(self, callback) -> None:
+        """Подписка на события хранилища ("saved", "deleted")"""
+        self._listeners.append(callback)
+
+    def _publish(self, event: str, owner: str, safe_name: str, **payload) -> None:
+        self._bump_version(owner)
+        for callback in self._listeners:
+            callback(event, owner, safe_name, **payload)
+
+    def _bump_version(self, owner: str) -> None:
+        # Поиск по префиксу "admin_" находит и файлы владельца "admin_x",
+        # поэтому версия меняется и у всех владельцев-префиксов
+        parts = owner.split("_")
+        with self._versions_lock:
+            for i in range(1, len(parts) + 1):
+                prefix_owner = "_".join(parts[:i])
+                self._owner_versions[prefix_owner] = self._owner_versions.get(prefix_owner, 0) + 1
+
+    def listing_version(self, username: str, user_role: str = None, admin_usernames: list = None) -> str:
+        """Версия списка файлов пользователя: меняется при загрузке файлов
+        пользователем или (для роли 'user') любым из администраторов."""
+        owners = [username]
+        if user_role == 'user' and admin_usernames:
+            owners.extend(sorted(admin_usernames))
+        with self._versions_lock:
+            parts = [f"{owner}:{self._owner_versions.get(owner, 0)}" for owner in owners]
+        raw = "\n".join([self._boot_token, str(user_role), *parts])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def file_validators(self, filename: str, username: str, user_role: str = None, admin_usernames: list = None) -> dict | None:
+        """Валидаторы HTTP-кэширования для файла без чтения шифротекста:
+        ETag - SHA-256 подписи (меняется вместе с содержимым), Last-Modified - дата изменения."""
+        for safe_name in self.candidate_names(filename, username, user_role, admin_usernames):
+            enc_path = self.upload_folder / (safe_name + ".enc")
+            sig_path = self.upload_folder / (safe_name + ".sig")
+            try:
+                modified = enc_path.stat().st_mtime
+                signature = sig_path.read_bytes()
+            except FileNotFoundError:
+                continue
+            return self._validators(safe_name, signature, modified)
+        return None
+
+    def stored_validators(self, safe_name: str, signature: bytes) -> dict:
+        """Валидаторы для уже прочитанного и проверенного файла хранилища"""
+        try:
+            modified = (self.upload_folder / (safe_name + ".enc")).stat().st_mtime
+        except FileNotFoundError:
+            modified = 0.0
+        return self._validators(safe_name, signature, modified)
+
+    @staticmethod
+    def _validators(safe_name: str, signature: bytes, modified: float) -> dict:
+        return {
+            'safe_name': safe_name,
+            'etag': hashlib.sha256(signature).hexdigest(),
+            'last_modified': modified,
+        }
+
+    @staticmethod
+    def _tmp_path(path: Path) -> Path:
+        """Уникальное имя временного файла рядом с path"""
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        """Записывает файл через временный файл и os.replace.
+        Читатели (и перешифрование заголовка на месте) никогда не видят недописанный файл."""
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _file_lock(self, safe_name: str) -> threading.Lock:
+        return self._file_locks[hash(safe_name) % FILE_LOCK_STRIPES]
+
+    @staticmethod
+    def _fsync_dir(path: Path) -> None:
+        """Сбрасывает на диск запись каталога (создание/удаление файла). На Windows недоступно"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _associated_data(safe_name: str) -> bytes:
+        """Associated data для AES-GCM: имя файла в хранилище (владелец + имя)"""
+        return safe_name.encode("utf-8")
+
+    def _decrypt_stored(self, encrypted: bytes, safe_name: str) -> bytes:
+        """Расшифровывает файл хранилища.
+        Файлы, сохранённые до привязки к имени, расшифровываются без associated data.
+        Если заголовок конверта подошёл к имени, повреждено само тело - вторую попытку не делаем."""
+        associated_data = self._associated_data(safe_name)
+        try:
+            return self.crypto.decrypt_symmetric(encrypted, associated_data)
+        except InvalidTag:
+            if self.crypto.header_matches(encrypted, associated_data):
+                raise
+            return self.crypto.decrypt_symmetric(encrypted)
+
+    def list_stored_files(self) -> list[str]:
+        """Возвращает имена всех файлов хранилища (safe_name), у которых есть подпись"""
+        if not self.upload_folder.exists():
+            return []
+        return sorted(
+            enc_file.stem for enc_file in self.upload_folder.glob("*.enc")
+            if (self.upload_folder / (enc_file.stem + ".sig")).exists()
+        )
+
+    def rekey_file(self, safe_name: str) -> int:
+        """Переводит файл хранилища на активный мастер-ключ.
+        Для файлов-конвертов переписывается только заголовок с ключом данных,
+        файлы старых форматов перешифровываются целиком.
+        Возвращает количество прочитанных и записанных байт (0, если файл уже актуален)."""
+        enc_path = self.upload_folder / (safe_name + ".enc")
+        stat_before = enc_path.stat()
+        associated_data = self._associated_data(safe_name)
+        with open(enc_path, "rb") as f:
+            # Для проверки ключа достаточно заголовка, весь файл читаем только при миграции
+            probe = f.read(REKEY_PROBE_SIZE)
+            if not self.crypto.needs_reencryption(probe):
+                return 0
+            if not self.crypto.is_envelope(probe):
+                f.seek(0)
+                encrypted = f.read()
+
+        if self.crypto.is_envelope(probe):
+            header = self.crypto.rewrap_header(probe, associated_data)
+            journal_path = self.upload_folder / (safe_name + REKEY_JOURNAL_SUFFIX)
+            # save_pdf заменяет файл целиком (новый inode), поэтому запись на месте
+            # не может испортить файл, загруженный во время перешифрования
+            with self._file_lock(safe_name), open(enc_path, "r+b") as f:
+                old_header = f.read(len(header))
+                if old_header != probe[:len(header)]:
+                    return len(probe)
+                # Прежний заголовок - единственная копия ключа данных: до перезаписи сохраняем его
+                # в журнал, чтобы после сбоя на середине записи файл можно было восстановить
+                with open(journal_path, "wb") as journal:
+                    journal.write(old_header)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self._fsync_dir(self.upload_folder)
+                f.seek(0)
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            journal_path.unlink()
+            os.utime(enc_path, ns=(stat_before.st_atime_ns, stat_before.st_mtime_ns))
+            return len(probe) + len(header)
+
+        compressed = self._decrypt_stored(encrypted, safe_name)
+        reencrypted = self.crypto.encrypt_symmetric(compressed, associated_data)
+
+        tmp_path = self._tmp_path(enc_path)
+        with open(tmp_path, "wb") as f:
+            f.write(reencrypted)
+        # Если файл перезаписали во время перешифрования, оставляем новую версию
+        stat_now = enc_path.stat()
+        if (stat_now.st_mtime_ns, stat_now.st_size) != (stat_before.st_mtime_ns, stat_before.st_size):
+            tmp_path.unlink()
+            return len(encrypted)
+        # Сохраняем дату изменения, чтобы не менялась "Дата загрузки" в списке файлов
+        os.utime(tmp_path, ns=(stat_before.st_atime_ns, stat_before.st_mtime_ns))
+        os.replace(tmp_path, enc_path)
+        return len(encrypted) + len(reencrypted)
+
+    def recover_interrupted_rekeys(self) -> int:
+        """Завершает перезаписи заголовков, прерванные сбоем: если текущий заголовок файла
+        не расшифровывается, возвращает прежний из журнала. Возвращает число восстановленных файлов"""
+        if not self.upload_folder.exists():
+            return 0
+        restored = 0
+        for journal_path in self.upload_folder.glob("*" + REKEY_JOURNAL_SUFFIX):
+            safe_name = journal_path.name[:-len(REKEY_JOURNAL_SUFFIX)]
+            enc_path = self.upload_folder / (safe_name + ".enc")
+            old_header = journal_path.read_bytes()
+            with self._file_lock(safe_name):
+                try:
+                    with open(enc_path, "r+b") as f:
+                        current = f.read(REKEY_PROBE_SIZE)
+                        try:
+                            self.crypto.rewrap_header(current, self._associated_data(safe_name))
+                        except Exception:
+                            if len(old_header) == ENVELOPE_HEADER_SIZE:
+                                f.seek(0)
+                                f.write(old_header)
+                                f.flush()
+                                os.fsync(f.fileno())
+                                restored += 1
+                except FileNotFoundError:
+                    pass
+            journal_path.unlink()
+        return restored
+
+    def candidate_names(self, filename: str, username: str, user_role: str = None, admin_usernames: list = None) -> list[str]:
+        """Имена файлов хранилища (safe_name), которые проверяются при открытии filename.
+        Если user_role == 'user', также проверяются файлы администраторов."""
         usernames_to_check = [username]
         
         # Если пользователь с ролью "user", также проверяем файлы админов
         if user_role == 'user' and admin_usernames:
             usernames_to_check.extend(admin_usernames)
         
-        # Пробуем найти файл у пользователя или у админов
-        for check_username in usernames_to_check:
-            safe_name = f"{check_username}_{filename}"
-            enc_path = self.upload_folder / (safe_name + ".enc")
-            sig_path = self.upload_folder / (safe_name + ".sig")
+        return [f"{check_username}_{filename}" for check_username in usernames_to_check]
 
-            if enc_path.exists() and sig_path.exists():
-                # Загружаем
-                with open(enc_path, "rb") as f:
+    def read_stored_file(self, safe_name: str) -> tuple[bytes, bytes] | None:
+        """Читает с диска зашифрованный файл и подпись. None, если файла нет"""
+        enc_path = self.upload_folder / (safe_name + ".enc")
+        sig_path = self.upload_folder / (safe_name + ".sig")
+        try:
+            with FILE_STAGE_SECONDS.time(stage="read"):
+                with self._file_lock(safe_name), open(enc_path, "rb") as f:
                     encrypted = f.read()
                 with open(sig_path, "rb") as f:
                     signature = f.read()
+        except FileNotFoundError:
+            return None
+        return encrypted, signature
 
-                # Расшифровка
-                try:
-                    compressed = self.crypto.decrypt_symmetric(encrypted)
-                    original_data = self.crypto.decompress(compressed)
-                except Exception:
-                    continue  # Пробуем следующий файл
-
-                # Проверка подписи
-                if self.crypto.verify_signature(original_data, signature):
-                    return original_data
+    def decode_stored_file(self, safe_name: str, encrypted: bytes, signature: bytes) -> bytes | None:
+        """Расшифровывает, распаковывает и проверяет подпись. None, если файл повреждён"""
+        # Расшифровка
+        try:
+            with FILE_STAGE_SECONDS.time(stage="decrypt"):
+                compressed = self._decrypt_stored(encrypted, safe_name)
+            with FILE_STAGE_SECONDS.time(stage="decompress"):
+                original_data = self.crypto.decompress(compressed)
+        except Exception:
+            return None
+
+        # Проверка подписи
+        with FILE_STAGE_SECONDS.time(stage="verify"):
+            verified = self.crypto.verify_signature(original_data, signature)
+        return original_data if verified else None
+
+    def load_pdf_for_user(self, filename: str, username: str, user_role: str = None, admin_usernames: list = None) -> bytes | None:
+        """Расшифровывает, проверяет подпись, возвращает PDF.
+        Если user_role == 'user', также проверяет файлы администраторов."""
+        loaded = self.load_pdf_with_validators(filename, username, user_role, admin_usernames)
+        return loaded[0] if loaded else None
+
+    def load_pdf_with_validators(self, filename: str, username: str, user_role: str = None,
+                                 admin_usernames: list = None) -> tuple[bytes, dict] | None:
+        """Как load_pdf_for_user, но вместе с PDF возвращает валидаторы HTTP-кэширования
+        именно того файла, который был расшифрован (повреждённые кандидаты пропускаются)."""
+        # Пробуем найти файл у пользователя или у админов
+        for safe_name in self.candidate_names(filename, username, user_role, admin_usernames):
+            stored = self.read_stored_file(safe_name)
+            if stored is None:
+                continue
+            original_data = self.decode_stored_file(safe_name, *stored)
+            if original_data is not None:
+                return original_data, self.stored_validators(safe_name, stored[1])
         
         return None
 
     def list_user_files(self, username: str, user_role: str = None, admin_usernames: list = None) -> list[dict]:
         """Возвращает список файлов пользователя с метаданными.
-        Если user_role == 'user', также возвращает файлы всех администраторов."""
+        Если user_role == 'user', также возвращает файлы всех администраторов.
+        Результат кэшируется до загрузки или удаления файла кем-либо из владельцев списка."""
+        admins = tuple(admin_usernames) if user_role == 'user' and admin_usernames else ()
+        cache_key = (str(self.upload_folder), username, user_role, admins)
+        # Версию берём до чтения диска: если файл загрузят во время чтения, запись сразу устареет
+        version = self.listing_version(username, user_role, admin_usernames)
+        cached = self.listing_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+
+        files = self._scan_user_files(username, user_role, admin_usernames)
+        self.listing_cache.put(cache_key, (version, files))
+        return list(files)
+
+    def _scan_user_files(self, username: str, user_role: str = None, admin_usernames: list = None) -> list[dict]:
+        """Собирает список файлов по содержимому директории"""
         files = []
         prefixes_to_check = [f"{username}_"]
         
@@ -0,0 +1,227 @@
+import threading
+import time
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NullTimer:
+    """Пустой таймер, который используется при выключенных метриках"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'key', 'start')
+
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, registry, name: str, help_text: str, label_names=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def time(self, **labels):
+        """Контекстный менеджер для замера длительности блока кода"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, self._key(labels))
+
+    def observe(self, value: float, **labels) -> None:
+        if self.registry.enabled:
+            self._observe(self._key(labels), value)
+
+    def _observe(self, key, value: float) -> None:
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            bucket_counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state) -> list[str]:
+        bucket_counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        le = _format_labels(self.label_names, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{le} {count}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик с выводом в текстовом формате Prometheus.
+    При выключенном реестре замеры сводятся к одной проверке флага."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics = []
+        self._caches = {}
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        return self._add(Counter(self, name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names=()) -> Gauge:
+        return self._add(Gauge(self, name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help_text, label_names, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, cache) -> None:
+        """Регистрирует кэш со счётчиками hits/misses; значения читаются при выводе метрик"""
+        self._caches[name] = cache
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        if self._caches:
+            lines.extend(self._render_caches())
+        return "\n".join(lines) + "\n"
+
+    def _render_caches(self) -> list[str]:
+        hits, misses, sizes, ratios = [], [], [], []
+        for name, cache in sorted(self._caches.items()):
+            label = _format_labels(("cache",), (name,))
+            total = cache.hits + cache.misses
+            hits.append(f"authvsu_cache_hits_total{label} {cache.hits}")
+            misses.append(f"authvsu_cache_misses_total{label} {cache.misses}")
+            sizes.append(f"authvsu_cache_entries{label} {len(cache)}")
+            ratios.append(f"authvsu_cache_hit_ratio{label} {_format_value(cache.hits / total if total else 0)}")
+        return [
+            "# HELP authvsu_cache_hits_total Попадания в кэш", "# TYPE authvsu_cache_hits_total counter", *hits,
+            "# HELP authvsu_cache_misses_total Промахи кэша", "# TYPE authvsu_cache_misses_total counter", *misses,
+            "# HELP authvsu_cache_entries Число записей в кэше", "# TYPE authvsu_cache_entries gauge", *sizes,
+            "# HELP authvsu_cache_hit_ratio Доля попаданий в кэш", "# TYPE authvsu_cache_hit_ratio gauge", *ratios,
+        ]
+
+
+# Общий реестр приложения; включается в app.py настройкой METRICS_ENABLED
+metrics = MetricsRegistry()
+
+FILE_STAGE_SECONDS = metrics.histogram(
+    'authvsu_file_stage_seconds',
+    'Время этапов обработки файлов (read/decrypt/decompress/verify/compress/encrypt/sign/write)',
+    ('stage',),
+)
+BCRYPT_SECONDS = metrics.histogram(
+    'authvsu_bcrypt_seconds',
+    'Время операций bcrypt',
+    ('operation',),
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+SCRUB_VERIFIED_TOTAL = metrics.counter(
+    'authvsu_scrub_verified_total',
+    'Файлы, проверенные фоновой проверкой целостности',
+    ('result',),
+)
+SCRUB_CORRUPTED_FILES = metrics.gauge(
+    'authvsu_scrub_corrupted_files',
+    'Число повреждённых файлов по результатам фоновой проверки',
+)
+AUDIT_EVENTS_TOTAL = metrics.counter(
+    'authvsu_audit_events_total',
+    'События журнала аудита: записанные и отброшенные при переполнении буфера',
+    ('result',),
+)
+AUDIT_FLUSH_SECONDS = metrics.histogram(
+    'authvsu_audit_flush_seconds',
+    'Время записи пачки событий аудита на диск (включая fsync)',
+)
@@ -1,8 +1,11 @@
 import bcrypt
+from services.metrics_service import BCRYPT_SECONDS
 
 class PasswordService:
     def hash_password(self, password: str) -> bytes:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        with BCRYPT_SECONDS.time(operation="hash"):
+            return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
 
     def verify_password(self, plain: str, hashed: bytes) -> bool:
-        return bcrypt.checkpw(plain.encode('utf-8'), hashed)
\ No newline at end of file
+        with BCRYPT_SECONDS.time(operation="verify"):
+            return bcrypt.checkpw(plain.encode('utf-8'), hashed)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import re
+import zlib
+
+# Начало данных потока; словарь объекта стоит между "obj" и "stream"
+_STREAM_START = re.compile(rb"stream\r?\n")
+_TOKEN = re.compile(r"\w{2,}")
+
+# Лексемы потока содержимого: комментарий, литеральная строка (допускается один уровень
+# вложенных скобок), шестнадцатеричная строка, имя и прочие лексемы (числа и операторы).
+# Скобки массивов и словарей пропускаются
+_CONTENT_TOKEN = re.compile(rb"""
+    %[^\r\n]*
+  | \((?P<literal>[^()\\]*(?:(?:\\.|\([^()\\]*(?:\\.[^()\\]*)*\))[^()\\]*)*)\)
+  | <(?P<hex>[0-9A-Fa-f\s]*)>
+  | /[^\s()<>\[\]{}/%]*
+  | (?P<token>[^\s()<>\[\]{}/%]+)
+""", re.DOTALL | re.VERBOSE)
+_ESCAPE = re.compile(rb"\\([0-7]{1,3}|\r\n|.)", re.DOTALL)
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f", b"\r": b"", b"\n": b"", b"\r\n": b""}
+_WHITESPACE = re.compile(rb"\s+")
+# Управляющие символы Latin-1 (чаще всего это CID-коды) из текста отбрасываются
+_UNPRINTABLE = {code: None for code in range(256) if not chr(code).isprintable()}
+# Сдвиг в массиве TJ (в тысячных долях em), начиная с которого считаем его пробелом между словами
+_TJ_SPACE = -200
+_TEXT_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+# Сколько байт потоков (после распаковки) разбирается в одном документе
+MAX_EXTRACT_BYTES = 16 * 1024 * 1024
+
+
+def extract_pdf_text(data: bytes, max_bytes: int = MAX_EXTRACT_BYTES) -> str:
+    """Минимальное извлечение текста из PDF без внешних библиотек:
+    распаковываются потоки FlateDecode (и потоки без фильтра), из них берутся строки
+    операторов вывода текста Tj, TJ, ' и ". Текст в шрифтах без однобайтовой кодировки
+    (CID-шрифты) таким способом не восстанавливается.
+    Всего разбирается не больше max_bytes байт распакованных потоков, так что небольшой
+    файл с сильно сжатым потоком не раздувается в памяти."""
+    pieces = []
+    position = 0
+    budget = max_bytes
+    while budget > 0:
+        match = _STREAM_START.search(data, position)
+        if match is None:
+            break
+        end = data.find(b"endstream", match.end())
+        if end < 0:
+            break
+        position = end + len(b"endstream")
+        dictionary = data[data.rfind(b"obj", 0, match.start()) + 1:match.start()]
+        stream = data[match.end():end]
+        if b"/Filter" in dictionary:
+            if b"/FlateDecode" not in dictionary:
+                continue  # изображения и прочие фильтры текста не содержат
+            try:
+                stream = zlib.decompressobj().decompress(stream, budget)
+            except zlib.error:
+                continue
+        else:
+            stream = stream[:budget]
+        budget -= len(stream)
+        if b"BT" in stream:
+            pieces.extend(_text_from_content(stream))
+    return " ".join(piece for piece in pieces if piece.strip())
+
+
+def tokenize(text: str) -> list[str]:
+    """Слова для поискового индекса: буквы и цифры от двух символов, в нижнем регистре"""
+    return _TOKEN.findall(text.lower())
+
+
+def _text_from_content(content: bytes) -> list[str]:
+    """Строки операторов вывода текста из потока содержимого страницы"""
+    pieces = []
+    operands = []
+    for match in _CONTENT_TOKEN.finditer(content):
+        literal, hex_digits, token = match.group("literal", "hex", "token")
+        if literal is not None:
+            if b"\\" in literal:
+                literal = _ESCAPE.sub(_unescape, literal)
+            operands.append(_decode_string(literal))
+        elif hex_digits is not None:
+            operands.append(_decode_hex(hex_digits))
+        elif token is None:
+            continue  # комментарии и имена
+        elif token[:1] in b"+-.0123456789":
+            try:
+                if float(token) < _TJ_SPACE:
+                    operands.append(" ")
+            except ValueError:
+                pass
+        else:
+            if token in _TEXT_OPERATORS:
+                pieces.append("".join(operands))
+            operands = []
+    return pieces
+
+
+def _unescape(match: re.Match) -> bytes:
+    """Экранированная последовательность литеральной строки (спецсимвол, восьмеричный код,
+    перенос строки или сам символ)"""
+    value = match.group(1)
+    if value in _ESCAPES:
+        return _ESCAPES[value]
+    if value[:1] in b"01234567":
+        return bytes([int(value, 8) & 0xFF])
+    return value
+
+
+def _decode_hex(value: bytes) -> str:
+    digits = _WHITESPACE.sub(b"", value)
+    if len(digits) % 2:
+        digits += b"0"
+    try:
+        return _decode_string(bytes.fromhex(digits.decode("ascii")))
+    except ValueError:
+        return ""
+
+
+def _decode_string(raw: bytes) -> str:
+    if raw.startswith(b"\xfe\xff"):
+        return raw[2:].decode("utf-16-be", errors="ignore")
+    # Однобайтовые кодировки шрифтов близки к Latin-1
+    return raw.decode("latin-1").translate(_UNPRINTABLE)
@@ -0,0 +1,107 @@
+import threading
+import time
+from services.file_service import FileService
+from services.throttle import IOThrottle
+
+
+class ReencryptionJob:
+    """Фоновое перешифрование хранилища активным ключом после ротации.
+    Файлы обрабатываются партиями с ограничением скорости ввода-вывода,
+    приложение продолжает обслуживать запросы."""
+
+    def __init__(self, file_service: FileService, io_budget: int = 0,
+                 batch_size: int = 50, batch_pause: float = 0.0):
+        self.file_service = file_service
+        self.throttle = IOThrottle(io_budget)
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._progress = self._empty_progress()
+
+    @staticmethod
+    def _empty_progress() -> dict:
+        return {
+            'running': False,
+            'key_id': None,
+            'total': 0,
+            'processed': 0,
+            'migrated': 0,
+            'skipped': 0,
+            'failed': 0,
+            'bytes': 0,
+            'started': None,
+            'finished': None,
+            'errors': [],
+        }
+
+    def start(self) -> bool:
+        """Запускает перешифрование. Возвращает False, если задача уже выполняется"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._progress = self._empty_progress()
+            self._progress.update(running=True, started=time.time(),
+                                  key_id=self.file_service.crypto.keyring.active_id)
+            self._thread = threading.Thread(target=self._run, name="reencryption", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Останавливает задачу после текущего файла"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def progress(self) -> dict:
+        """Снимок текущего прогресса"""
+        with self._lock:
+            snapshot = dict(self._progress)
+            snapshot['errors'] = list(self._progress['errors'])
+            return snapshot
+
+    def _update(self, **increments) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self._progress[name] += value
+
+    def _run(self) -> None:
+        try:
+            self.file_service.recover_interrupted_rekeys()
+            names = self.file_service.list_stored_files()
+            with self._lock:
+                self._progress['total'] = len(names)
+            for start in range(0, len(names), self.batch_size):
+                for safe_name in names[start:start + self.batch_size]:
+                    if self._stop.is_set():
+                        return
+                    self._process(safe_name)
+                if self.batch_pause > 0 and self._stop.wait(self.batch_pause):
+                    return
+        finally:
+            with self._lock:
+                self._progress['running'] = False
+                self._progress['finished'] = time.time()
+
+    def _process(self, safe_name: str) -> None:
+        try:
+            nbytes = self.file_service.rekey_file(safe_name)
+        except FileNotFoundError:
+            self._update(processed=1, skipped=1)  # файл удалён во время обработки
+            return
+        except Exception as e:
+            self._update(processed=1, failed=1)
+            with self._lock:
+                self._progress['errors'].append(f"{safe_name}: {type(e).__name__}")
+            return
+        if nbytes:
+            self._update(processed=1, migrated=1, bytes=nbytes)
+            self.throttle.consume(nbytes, self._stop)
+        else:
+            self._update(processed=1, skipped=1)
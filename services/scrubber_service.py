@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from services.file_service import FileService
+from services.metrics_service import SCRUB_CORRUPTED_FILES, SCRUB_VERIFIED_TOTAL
+from services.throttle import IOThrottle
+
+
+class IntegrityScrubber:
+    """Фоновая проверка целостности хранилища: расшифровка и проверка подписи каждого файла.
+    Результаты сохраняются, повторно проверяются только изменённые файлы и файлы,
+    проверенные раньше чем stale_after секунд назад."""
+
+    def __init__(self, file_service: FileService, state_path: Path | None = None,
+                 io_budget: int = 0, cpu_budget: float = 1.0, stale_after: float = 7 * 24 * 3600,
+                 interval: float = 3600, start_delay: float = 0):
+        self.file_service = file_service
+        self.state_path = state_path or file_service.upload_folder / ".scrub_state.json"
+        self.throttle = IOThrottle(io_budget)
+        # Доля процессорного времени, которую может занимать проверка (0 < cpu_budget <= 1)
+        self.cpu_budget = min(max(cpu_budget, 0.01), 1.0)
+        self.stale_after = stale_after
+        self.interval = interval
+        self.start_delay = start_delay
+        self._state = self._load_state()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_pass = None
+        self._update_metrics()
+
+    def _load_state(self) -> dict:
+        try:
+            return json.loads(self.state_path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        with self._lock:
+            payload = json.dumps(self._state, ensure_ascii=False)
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp_path.write_text(payload, encoding='utf-8')
+        os.replace(tmp_path, self.state_path)
+
+    def start(self) -> None:
+        """Запускает периодическую проверку в фоновом потоке"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="integrity-scrubber", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self) -> None:
+        """Запускает внеочередной проход, не дожидаясь интервала"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        self._wait(self.start_delay)
+        while not self._stop.is_set():
+            self.scan_once()
+            self._wait(self.interval)
+
+    def _wait(self, seconds: float) -> None:
+        if self._wake.wait(seconds):
+            self._wake.clear()
+
+    def scan_once(self) -> dict:
+        """Один проход по хранилищу. Возвращает статистику прохода"""
+        stats = {'checked': 0, 'skipped': 0, 'corrupted': 0, 'started': time.time()}
+        names = self.file_service.list_stored_files()
+        with self._lock:
+            for removed in set(self._state) - set(names):
+                del self._state[removed]
+        for safe_name in names:
+            if self._stop.is_set():
+                break
+            result = self._check(safe_name)
+            if result is None:
+                stats['skipped'] += 1
+                continue
+            stats['checked'] += 1
+            if not result:
+                stats['corrupted'] += 1
+        stats['finished'] = time.time()
+        self.last_pass = stats
+        self._save_state()
+        self._update_metrics()
+        return stats
+
+    def _fingerprint(self, safe_name: str) -> dict | None:
+        folder = self.file_service.upload_folder
+        try:
+            enc_stat = (folder / (safe_name + ".enc")).stat()
+            sig_stat = (folder / (safe_name + ".sig")).stat()
+        except FileNotFoundError:
+            return None
+        return {'enc_mtime_ns': enc_stat.st_mtime_ns, 'enc_size': enc_stat.st_size,
+                'sig_mtime_ns': sig_stat.st_mtime_ns}
+
+    def _check(self, safe_name: str) -> bool | None:
+        """Проверяет файл, если он изменился или устарела проверка.
+        Возвращает результат проверки или None, если проверка не нужна."""
+        fingerprint = self._fingerprint(safe_name)
+        if fingerprint is None:
+            return None
+        with self._lock:
+            previous = self._state.get(safe_name)
+        if (previous is not None
+                and all(previous.get(k) == v for k, v in fingerprint.items())
+                and time.time() - previous['verified_at'] < self.stale_after):
+            return None
+
+        self.throttle.consume(fingerprint['enc_size'], self._stop)
+        start = time.perf_counter()
+        stored = self.file_service.read_stored_file(safe_name)
+        ok = stored is not None and self.file_service.decode_stored_file(safe_name, *stored) is not None
+        elapsed = time.perf_counter() - start
+
+        SCRUB_VERIFIED_TOTAL.inc(result="ok" if ok else "corrupted")
+        with self._lock:
+            self._state[safe_name] = dict(fingerprint, verified_at=time.time(), ok=ok)
+        # Ограничение CPU: после работы длительностью t отдыхаем t * (1 - доля) / доля
+        if self.cpu_budget < 1.0:
+            self._stop.wait(elapsed * (1 - self.cpu_budget) / self.cpu_budget)
+        return ok
+
+    def corrupted_files(self) -> list[dict]:
+        """Файлы, не прошедшие последнюю проверку"""
+        with self._lock:
+            return [
+                {'safe_name': name, 'verified_at': entry['verified_at']}
+                for name, entry in sorted(self._state.items()) if not entry['ok']
+            ]
+
+    def summary(self) -> dict:
+        with self._lock:
+            verified = len(self._state)
+            corrupted = sum(1 for entry in self._state.values() if not entry['ok'])
+        return {'verified': verified, 'corrupted': corrupted, 'last_pass': self.last_pass}
+
+    def _update_metrics(self) -> None:
+        SCRUB_CORRUPTED_FILES.set(self.summary()['corrupted'])
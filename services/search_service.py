@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from pathlib import Path
+from cryptography.exceptions import InvalidTag
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+from services.pdf_text import MAX_EXTRACT_BYTES, extract_pdf_text, tokenize
+from services.throttle import IOThrottle
+
+# Дополнительные данные AES-GCM для файла индекса: шифротекст нельзя подменить файлом-документом
+SEARCH_INDEX_AAD = b"search-index:v1"
+
+logger = logging.getLogger(__name__)
+
+
+class SearchIndex:
+    """Полнотекстовый поиск по загруженным PDF.
+    Текст извлекается из исходного PDF после сохранения (событие хранилища "saved")
+    в фоновом потоке, обратный индекс хранится на диске в зашифрованном виде.
+    Поиск работает только по индексу, документы при запросе не расшифровываются."""
+
+    def __init__(self, crypto_service: CryptoService, path: Path, flush_delay: float = 2.0,
+                 max_extract_bytes: int = MAX_EXTRACT_BYTES, max_queued_bytes: int = 64 * 1024 * 1024,
+                 backfill_io_budget: int = 0):
+        self.crypto = crypto_service
+        # Сверка с хранилищем при запуске читает и расшифровывает файлы в фоне,
+        # поэтому, как проверка целостности и перешифрование, ограничена по вводу-выводу
+        self.throttle = IOThrottle(backfill_io_budget)
+        self._stop = threading.Event()
+        self._path = Path(path)
+        self.flush_delay = flush_delay
+        self.max_extract_bytes = max_extract_bytes
+        # События хранилища разбираются по порядку одним фоновым потоком. Очередь ограничена
+        # суммарным размером ожидающих PDF: при наплыве загрузок сохранение ждёт освобождения места
+        self._events = queue.Queue()
+        self.max_queued_bytes = max_queued_bytes
+        self._queued_bytes = 0
+        self._queue_space = threading.Condition()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # Записи на диск идут по одной, чтобы старый снимок не перезаписал более новый
+        self._save_lock = threading.Lock()
+        # safe_name -> {'owner', 'filename', 'terms': {слово: число вхождений}}
+        self._documents = {}
+        # слово -> множество safe_name
+        self._postings = {}
+        self._flush_timer = None
+        # Есть изменения, которых ещё нет на диске; после close() индекс больше не записывается
+        self._dirty = False
+        self._closed = False
+        self._load()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @path.setter
+    def path(self, path: Path) -> None:
+        """Смена файла индекса (например, при подмене директории хранилища):
+        отложенная запись по старому пути отменяется"""
+        with self._lock:
+            self._cancel_flush()
+            self._path = Path(path)
+
+    def _load(self) -> None:
+        """Загружает индекс с диска. Повреждённый или зашифрованный другим ключом файл не мешает
+        запуску: индекс начинается пустым и заполняется заново через index_stored_files()"""
+        try:
+            encrypted = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+        try:
+            payload = self.crypto.decompress(self.crypto.decrypt_symmetric(encrypted, SEARCH_INDEX_AAD))
+            documents = {
+                safe_name: (document['owner'], document['filename'], dict(document['terms']))
+                for safe_name, document in json.loads(payload.decode("utf-8")).items()
+            }
+        except (InvalidTag, OSError, EOFError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            logger.warning("Поисковый индекс %s не загружен (%s: %s), он будет построен заново",
+                           self.path, type(exc).__name__, exc)
+            return
+        for safe_name, (owner, filename, terms) in documents.items():
+            self._add(safe_name, owner, filename, terms)
+        self._dirty = False
+
+    def save(self) -> None:
+        """Записывает индекс на диск (зашифрованным, с атомарной заменой файла), если он изменился"""
+        with self._save_lock:
+            with self._lock:
+                self._cancel_flush()
+                if not self._dirty or self._closed:
+                    return
+                payload = json.dumps(self._documents, ensure_ascii=False).encode("utf-8")
+                path = self._path
+                self._dirty = False
+            try:
+                encrypted = self.crypto.encrypt_symmetric(self.crypto.compress(payload), SEARCH_INDEX_AAD)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp_path.write_bytes(encrypted)
+                os.replace(tmp_path, path)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def close(self) -> None:
+        """Дожидается разбора очереди и записывает несохранённые изменения;
+        после этого индекс на диск не пишется. Сверка с хранилищем прерывается"""
+        self._stop.set()
+        self.wait_idle()
+        self.save()
+        with self._lock:
+            self._closed = True
+
+    def _cancel_flush(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _schedule_save(self) -> None:
+        """Откладывает запись, чтобы серия загрузок сохранила индекс один раз"""
+        if self.flush_delay <= 0:
+            self.save()
+            return
+        with self._lock:
+            if self._flush_timer is not None or self._closed:
+                return
+            self._flush_timer = threading.Timer(self.flush_delay, self.save)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def on_storage_event(self, event: str, owner: str, safe_name: str, **payload) -> None:
+        """Подписчик FileService: сохранённые файлы индексируются, удалённые убираются из индекса.
+        Разбор PDF идёт в фоновом потоке, запрос загрузки его не ждёт."""
+        if event == "saved":
+            data = payload['data']
+            self._submit(len(data), self.add_document, safe_name, owner, safe_name[len(owner) + 1:], data)
+        elif event == "deleted":
+            self._submit(0, self.remove_document, safe_name)
+
+    def wait_idle(self) -> None:
+        """Ждёт, пока все поставленные в очередь события хранилища попадут в индекс"""
+        self._events.join()
+
+    def _submit(self, size: int, handler, *args) -> None:
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="search-indexer", daemon=True)
+                self._worker.start()
+        with self._queue_space:
+            # Документ больше лимита всё равно принимается, когда очередь пуста
+            self._queue_space.wait_for(
+                lambda: not self._queued_bytes or self._queued_bytes + size <= self.max_queued_bytes
+            )
+            self._queued_bytes += size
+        self._events.put((size, handler, args))
+
+    def _run(self) -> None:
+        while True:
+            size, handler, args = self._events.get()
+            try:
+                handler(*args)
+            except Exception:
+                logger.exception("Ошибка индексации %s", args[0])
+            finally:
+                with self._queue_space:
+                    self._queued_bytes -= size
+                    self._queue_space.notify_all()
+                self._events.task_done()
+
+    def add_document(self, safe_name: str, owner: str, filename: str, data: bytes) -> None:
+        """Индексирует текст PDF и имя файла (заменяя прежнюю версию документа)"""
+        terms = Counter(tokenize(filename.rsplit(".", 1)[0].replace("_", " ")))
+        terms.update(tokenize(extract_pdf_text(data, self.max_extract_bytes)))
+        with self._lock:
+            self._remove(safe_name)
+            self._add(safe_name, owner, filename, dict(terms))
+        self._schedule_save()
+
+    def remove_document(self, safe_name: str) -> None:
+        with self._lock:
+            removed = self._remove(safe_name)
+        if removed:
+            self._schedule_save()
+
+    def _add(self, safe_name: str, owner: str, filename: str, terms: dict) -> None:
+        self._documents[safe_name] = {'owner': owner, 'filename': filename, 'terms': terms}
+        self._dirty = True
+        for term in terms:
+            self._postings.setdefault(term, set()).add(safe_name)
+
+    def _remove(self, safe_name: str) -> bool:
+        document = self._documents.pop(safe_name, None)
+        if document is None:
+            return False
+        self._dirty = True
+        for term in document['terms']:
+            names = self._postings.get(term)
+            if names is not None:
+                names.discard(safe_name)
+                if not names:
+                    del self._postings[term]
+        return True
+
+    def index_stored_files(self, file_service: FileService, owners: list[str]) -> int:
+        """Сверяет индекс с хранилищем: добавляет файлы, загруженные до появления индекса,
+        и убирает записи о файлах, которых в хранилище больше нет (например, удалённых,
+        пока приложение было остановлено). Владелец определяется по самому длинному
+        подходящему префиксу из owners. Чтение файлов ограничено backfill_io_budget байт/с.
+        Возвращает число проиндексированных файлов."""
+        owners = sorted(owners, key=len, reverse=True)
+        stored_files = file_service.list_stored_files()
+        with self._lock:
+            stale = set(self._documents).difference(stored_files)
+        for safe_name in stale:
+            # Файл мог появиться заново, пока шла сверка
+            if not (file_service.upload_folder / (safe_name + ".enc")).exists():
+                self.remove_document(safe_name)
+        indexed = 0
+        for safe_name in stored_files:
+            if self._stop.is_set():
+                break
+            with self._lock:
+                if safe_name in self._documents:
+                    continue
+            owner = next((name for name in owners if safe_name.startswith(f"{name}_")), None)
+            if owner is None:
+                continue
+            stored = file_service.read_stored_file(safe_name)
+            if stored is None:
+                continue
+            self.throttle.consume(len(stored[0]), self._stop)
+            data = file_service.decode_stored_file(safe_name, *stored)
+            if data is not None:
+                self.add_document(safe_name, owner, safe_name[len(owner) + 1:], data)
+                indexed += 1
+        return indexed
+
+    def search(self, query: str, username: str, user_role: str = None,
+               admin_usernames: list = None, limit: int = 50) -> list[dict]:
+        """Файлы, содержащие все слова запроса, среди доступных пользователю:
+        свои файлы и (для роли 'user') файлы администраторов - как в load_pdf_for_user.
+        Если файл с тем же именем есть у нескольких владельцев, возвращается тот,
+        который откроет /view_pdf."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        owners = [username]
+        if user_role == 'user' and admin_usernames:
+            owners.extend(admin_usernames)
+        owner_rank = {owner: rank for rank, owner in reversed(list(enumerate(owners)))}
+
+        with self._lock:
+            postings = [self._postings.get(term, set()) for term in terms]
+            postings.sort(key=len)
+            matches = set.intersection(*postings) if postings[0] else set()
+            found = {}
+            for safe_name in matches:
+                document = self._documents[safe_name]
+                rank = owner_rank.get(document['owner'])
+                if rank is None:
+                    continue
+                previous = found.get(document['filename'])
+                if previous is not None and previous['rank'] <= rank:
+                    continue
+                found[document['filename']] = {
+                    'filename': document['filename'],
+                    'owner': document['owner'],
+                    'is_owner': document['owner'] == username,
+                    'score': sum(document['terms'][term] for term in terms),
+                    'rank': rank,
+                }
+        results = sorted(found.values(), key=lambda item: (-item['score'], item['filename']))[:limit]
+        for item in results:
+            del item['rank']
+        return results
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._documents)
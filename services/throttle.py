@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class IOThrottle:
+    """Ограничивает среднюю скорость ввода-вывода фоновых задач (token bucket).
+    bytes_per_second <= 0 отключает ограничение."""
+
+    def __init__(self, bytes_per_second: int, burst: int | None = None):
+        self.rate = bytes_per_second
+        self.burst = burst if burst is not None else max(bytes_per_second, 0)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int, stop_event: threading.Event | None = None) -> None:
+        """Списывает nbytes из бюджета, при необходимости засыпает.
+        Ожидание прерывается, если установлен stop_event."""
+        if self.rate <= 0 or nbytes <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
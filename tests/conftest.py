@@ -1,15 +1,32 @@
 """Конфигурация pytest"""
+import os
 import pytest
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 
 # Добавляем корневую директорию в путь
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+# Журнал аудита и поисковый индекс приложения во время тестов пишутся во временную
+# директорию, а не в logs/ и uploads/
+RUNTIME_DIR = Path(tempfile.mkdtemp(prefix="authvsu_tests_"))
+os.environ['AUDIT_LOG_FILE'] = str(RUNTIME_DIR / "audit.log")
+os.environ['SEARCH_INDEX_FILE'] = str(RUNTIME_DIR / ".search_index.bin")
+
 from app import app as flask_app
 
 
+def pytest_sessionfinish(session, exitstatus):
+    """Дописывает журнал аудита и индекс и удаляет временную директорию"""
+    import app as app_module
+    app_module.audit_log.stop(timeout=5)
+    app_module.search_index.close()
+    shutil.rmtree(RUNTIME_DIR, ignore_errors=True)
+
+
 @pytest.fixture
 def app():
     """Создание тестового Flask приложения"""
@@ -0,0 +1,183 @@
+"""Тесты для ASGI-режима"""
+import asyncio
+import pytest
+import threading
+import tempfile
+import shutil
+from pathlib import Path
+from io import BytesIO
+
+import app as app_module
+from asgi import AsyncFileApp
+
+
+def run_request(application, path, cookie=None, extra_headers=None, method='GET'):
+    """Выполняет запрос к ASGI-приложению, возвращает (status, headers, body, число порций)"""
+    headers = [(b"host", b"localhost")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    headers.extend(extra_headers or [])
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b"", 'root_path': "", 'headers': headers,
+        'client': ('127.0.0.1', 1234), 'server': ('localhost', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b"", 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start = messages[0]
+    bodies = [m for m in messages[1:] if m['type'] == 'http.response.body']
+    return (start['status'], dict(start['headers']),
+            b"".join(m.get('body', b"") for m in bodies), len(bodies))
+
+
+class TestAsyncFileApp:
+    """Тесты асинхронной отдачи PDF"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.file_service = app_module.FileService(app_module.crypto_service)
+        self.file_service.upload_folder = self.temp_dir
+        self.application = AsyncFileApp(app_module.app, self.file_service, lambda: ["admin"],
+                                        io_workers=2, cpu_workers=2, chunk_size=1024)
+        self.pdf_content = b"%PDF-1.4 " + b"x" * 5000
+        file_obj = BytesIO(self.pdf_content)
+        file_obj.filename = "lecture.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def session_cookie(self, username, role):
+        serializer = app_module.app.session_interface.get_signing_serializer(app_module.app)
+        value = serializer.dumps({'username': username, 'role': role})
+        return f"{app_module.app.config['SESSION_COOKIE_NAME']}={value}"
+    
+    def test_view_pdf_streams_in_chunks(self):
+        """Тест: PDF отдаётся порциями с корректными заголовками"""
+        status, headers, body, chunks = run_request(
+            self.application, "/view_pdf/lecture.pdf", self.session_cookie("student", "user")
+        )
+        
+        assert status == 200
+        assert headers[b"content-type"] == b"application/pdf"
+        assert headers[b"content-length"] == str(len(self.pdf_content)).encode()
+        assert body == self.pdf_content
+        assert chunks == 5
+    
+    def test_view_pdf_without_session_redirects(self):
+        """Тест: без сессии запрос уходит во Flask и получает redirect на вход"""
+        status, headers, _, _ = run_request(self.application, "/view_pdf/lecture.pdf")
+        
+        assert status == 302
+        assert b"/login" in headers[b"location"]
+    
+    def test_view_pdf_forged_cookie_redirects(self):
+        """Тест: cookie с неверной подписью не принимается"""
+        status, _, _, _ = run_request(
+            self.application, "/view_pdf/lecture.pdf", "session=forged.cookie.value"
+        )
+        
+        assert status == 302
+    
+    def test_view_pdf_access_rules(self):
+        """Тест: файлы другого пользователя недоступны (redirect на список файлов)"""
+        status, headers, _, _ = run_request(
+            self.application, "/view_pdf/lecture.pdf", self.session_cookie("other_admin", "admin")
+        )
+        
+        assert status == 302
+        assert b"/files" in headers[b"location"]
+    
+    def test_other_routes_are_served_by_flask(self):
+        """Тест: остальные маршруты обслуживает Flask"""
+        status, _, body, _ = run_request(self.application, "/login")
+        
+        assert status == 200
+        assert "Войти".encode() in body
+
+    def test_fallback_requests_run_concurrently(self):
+        """Тест: маршруты Flask выполняются в пуле потоков, а не по очереди в одном потоке"""
+        barrier = threading.Barrier(2, timeout=5)
+        threads = set()
+        
+        def slow_wsgi_app(environ, start_response):
+            threads.add(threading.current_thread().name)
+            barrier.wait()  # дождётся второго запроса, только если они идут параллельно
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+        application = AsyncFileApp(slow_wsgi_app, self.file_service, lambda: [], wsgi_workers=4)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': "/slow", 'raw_path': b"/slow",
+            'query_string': b"", 'root_path': "", 'headers': [(b"host", b"localhost")],
+        }
+        statuses = []
+        
+        async def receive():
+            return {'type': 'http.request', 'body': b"", 'more_body': False}
+        
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+        
+        async def run_both():
+            await asyncio.gather(application(dict(scope), receive, send), application(dict(scope), receive, send))
+        asyncio.run(run_both())
+        
+        assert statuses == [200, 200]
+        assert len(threads) == 2
+        assert all(name.startswith("asgi-wsgi") for name in threads)
+    
+    def test_view_pdf_conditional_request(self):
+        """Тест: условный запрос с актуальным ETag получает 304"""
+        cookie = self.session_cookie("student", "user")
+        _, headers, _, _ = run_request(self.application, "/view_pdf/lecture.pdf", cookie)
+        
+        status, _, body, _ = run_request(self.application, "/view_pdf/lecture.pdf", cookie,
+                                         [(b"if-none-match", headers[b"etag"])])
+        
+        assert headers[b"cache-control"].startswith(b"private")
+        assert status == 304
+        assert body == b""
+    
+    def test_head_sends_headers_only(self):
+        """Тест: HEAD обслуживается без тела, но с длиной содержимого"""
+        status, headers, body, _ = run_request(
+            self.application, "/view_pdf/lecture.pdf", self.session_cookie("student", "user"), method='HEAD'
+        )
+        
+        assert status == 200
+        assert headers[b"content-length"] == str(len(self.pdf_content)).encode()
+        assert body == b""
+        assert self.application.inflight_bytes == 0
+    
+    def test_inflight_limit_returns_503(self):
+        """Тест: при превышении объёма расшифрованных данных в памяти клиент получает 503"""
+        self.application.max_inflight_bytes = 100
+        self.application.inflight_bytes = 50  # другое соединение уже держит данные
+        
+        status, headers, _, _ = run_request(
+            self.application, "/view_pdf/lecture.pdf", self.session_cookie("student", "user")
+        )
+        
+        assert status == 503
+        assert headers[b"retry-after"] == b"1"
+        
+        self.application.inflight_bytes = 0
+        status, _, body, _ = run_request(
+            self.application, "/view_pdf/lecture.pdf", self.session_cookie("student", "user")
+        )
+        assert status == 200
+        assert body == self.pdf_content
+        assert self.application.inflight_bytes == 0
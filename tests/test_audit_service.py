@@ -0,0 +1,100 @@
+"""Тесты для AuditLog"""
+import json
+import pytest
+import tempfile
+import time
+import shutil
+from pathlib import Path
+from services.audit_service import AuditLog
+
+
+class TestAuditLog:
+    """Тесты журнала аудита"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.path = self.temp_dir / "audit.log"
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def read_events(self, path=None):
+        return [json.loads(line) for line in (path or self.path).read_text(encoding='utf-8').splitlines()]
+    
+    def test_events_are_written_in_order(self):
+        """Тест: события записываются в файл в порядке поступления"""
+        audit_log = AuditLog(self.path, batch_size=2)
+        audit_log.record('login', 'admin', result='success')
+        audit_log.record('upload_pdf', 'admin', file='a.pdf')
+        audit_log.record('view_pdf', 'user1', file='a.pdf')
+        
+        assert not self.path.exists()
+        assert audit_log.flush() == 3
+        
+        events = self.read_events()
+        assert [e['action'] for e in events] == ['login', 'upload_pdf', 'view_pdf']
+        assert events[2]['user'] == 'user1'
+        assert events[2]['file'] == 'a.pdf'
+        assert audit_log.stats()['batches'] == 2
+    
+    def test_background_writer_flushes(self):
+        """Тест: фоновый поток записывает события без явного flush"""
+        audit_log = AuditLog(self.path, flush_interval=0.05)
+        audit_log.start()
+        try:
+            audit_log.record('login', 'admin')
+            deadline = time.time() + 5
+            while audit_log.stats()['written'] < 1 and time.time() < deadline:
+                time.sleep(0.01)
+            assert self.read_events()[0]['action'] == 'login'
+        finally:
+            audit_log.stop(timeout=5)
+    
+    def test_full_buffer_drops_and_reports(self):
+        """Тест: при заполненном буфере события отбрасываются и учитываются в журнале"""
+        audit_log = AuditLog(self.path, capacity=2, block_timeout=0)
+        
+        assert audit_log.record('login', 'a')
+        assert audit_log.record('login', 'b')
+        assert not audit_log.record('login', 'c')
+        assert audit_log.stats()['dropped'] == 1
+        
+        audit_log.flush()
+        events = self.read_events()
+        assert [e['user'] for e in events[:2]] == ['a', 'b']
+        assert events[-1]['action'] == 'audit.dropped'
+        assert events[-1]['count'] == 1
+    
+    def test_rotation_by_size(self):
+        """Тест: при превышении размера файл ротируется, старые копии сохраняются"""
+        audit_log = AuditLog(self.path, batch_size=1, max_bytes=200, backup_count=2)
+        for i in range(10):
+            audit_log.record('view_pdf', 'user1', file=f"file{i}.pdf")
+            audit_log.flush()
+        audit_log.stop()
+        
+        assert self.path.stat().st_size <= 200
+        assert (self.temp_dir / "audit.log.1").exists()
+        assert (self.temp_dir / "audit.log.2").exists()
+        assert not (self.temp_dir / "audit.log.3").exists()
+        assert self.read_events()[-1]['file'] == "file9.pdf"
+    
+    def test_stop_writes_pending_events(self):
+        """Тест: при остановке оставшиеся события дописываются"""
+        audit_log = AuditLog(self.path, flush_interval=60)
+        audit_log.start()
+        audit_log.record('admin.rotate_key', 'admin', key_id=1)
+        audit_log.stop(timeout=5)
+        
+        assert self.read_events()[0]['key_id'] == 1
+    
+    def test_disabled_log_records_nothing(self):
+        """Тест: выключенный журнал не принимает события"""
+        audit_log = AuditLog(self.path, enabled=False)
+        
+        assert not audit_log.record('login', 'admin')
+        assert audit_log.flush() == 0
+        assert not self.path.exists()
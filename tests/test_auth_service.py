@@ -81,3 +81,35 @@ class TestAuthService:
         assert result is False
         assert self.user_repo.get_user("testuser") is not None
 
+
+    
+    def test_get_admin_usernames(self):
+        """Тест: список администраторов обновляется при создании и удалении пользователей"""
+        self.auth_service.create_user("admin1", "password123", "admin")
+        self.auth_service.create_user("student", "password123", "user")
+        
+        assert self.auth_service.get_admin_usernames() == ["admin1"]
+        
+        self.auth_service.create_user("admin2", "password123", "admin")
+        assert self.auth_service.get_admin_usernames() == ["admin1", "admin2"]
+        
+        self.auth_service.remove_user("admin1", "admin2")
+        assert self.auth_service.get_admin_usernames() == ["admin2"]
+
+    def test_admin_list_collected_during_delete_is_not_cached(self):
+        """Тест: список, собранный до удаления администратора, не остаётся в кэше"""
+        self.auth_service.create_user("admin1", "password123", "admin")
+        self.auth_service.create_user("admin2", "password123", "admin")
+        repo = self.auth_service.user_repo
+        original_list_users = repo.list_users
+        
+        def list_users_with_concurrent_delete():
+            users = original_list_users()
+            repo.list_users = original_list_users
+            self.auth_service.remove_user("admin1", "admin2")
+            return users
+        repo.list_users = list_users_with_concurrent_delete
+        
+        self.auth_service.get_admin_usernames()
+        
+        assert self.auth_service.get_admin_usernames() == ["admin2"]
@@ -0,0 +1,52 @@
+"""Тесты для сравнения результатов бенчмарков"""
+import pytest
+from benchmarks.common import result, result_key
+from benchmarks.run import compare
+from benchmarks.loadtest import FlaskClientSession, percentile, run_load
+
+
+def make_entry(name, seconds, **params):
+    entry = result(name, params, {'min': seconds, 'median': seconds})
+    entry['suite'] = 'pipeline'
+    return entry
+
+
+def test_result_key_includes_params():
+    """Тест: ключ результата учитывает набор и параметры"""
+    entry = make_entry('save_pdf', 0.1, size=1024)
+    
+    assert result_key(entry) == "pipeline:save_pdf[size=1024]"
+
+
+def test_compare_detects_regression():
+    """Тест: замедление выше порога помечается как регрессия"""
+    baseline = [make_entry('save_pdf', 0.100, size=1024), make_entry('save_pdf', 0.100, size=2048)]
+    current = [make_entry('save_pdf', 0.105, size=1024), make_entry('save_pdf', 0.150, size=2048),
+               make_entry('load_pdf_for_user', 0.1, size=1024)]
+    
+    rows = compare(current, baseline, threshold=0.10)
+    
+    assert [row['status'] for row in rows] == ['ok', 'REGRESSION']
+
+
+def test_percentile_nearest_rank():
+    """Тест: перцентили считаются методом ближайшего ранга"""
+    samples = [float(i) for i in range(1, 101)]
+    
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_loadtest_smoke(app, tmp_path, monkeypatch):
+    """Тест: нагрузочный сценарий проходит все маршруты без ошибок"""
+    import app as app_module
+    monkeypatch.setattr(app_module.file_service, 'upload_folder', tmp_path)
+    
+    rows = run_load(app_module, lambda: FlaskClientSession(app), users=2, admins=1, files=2,
+                    file_size=2048, requests_per_user=2, uploads=2, concurrency=2)
+    
+    by_route = {row['route']: row for row in rows}
+    assert set(by_route) == {'POST /login', 'GET /files', 'GET /view_pdf', 'POST /upload_pdf'}
+    assert all(row['errors'] == 0 for row in rows)
+    assert by_route['GET /view_pdf']['requests'] == 4
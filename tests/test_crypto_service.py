@@ -1,6 +1,8 @@
 """Тесты для CryptoService"""
 import pytest
-from services.crypto_service import CryptoService
+from pathlib import Path
+from cryptography.exceptions import InvalidTag
+from services.crypto_service import CryptoService, KeyRing, FAST_PATH_MAX_SIZE, ENVELOPE_HEADER_SIZE
 
 
 class TestCryptoService:
@@ -93,3 +95,178 @@ class TestCryptoService:
         
         assert decrypted == empty_data
 
+
+    def test_encrypt_decrypt_with_associated_data(self):
+        """Тест: шифрование с associated data"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data, b"admin_test.pdf")
+        
+        assert self.crypto.decrypt_symmetric(encrypted, b"admin_test.pdf") == self.test_data
+    
+    def test_decrypt_wrong_associated_data(self):
+        """Тест: шифротекст нельзя расшифровать с другим associated data"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data, b"admin_test.pdf")
+        
+        with pytest.raises(InvalidTag):
+            self.crypto.decrypt_symmetric(encrypted, b"admin_other.pdf")
+        with pytest.raises(InvalidTag):
+            self.crypto.decrypt_symmetric(encrypted)
+    
+    def test_corrupted_data_with_header_is_not_retried_as_legacy(self, monkeypatch):
+        """Тест: InvalidTag для данных с заголовком не приводит к попытке старого формата"""
+        encrypted = bytearray(self.crypto.encrypt_symmetric(self.test_data, b"admin_test.pdf"))
+        encrypted[-1] ^= 1
+        opened = []
+        open_sealed = CryptoService._open
+        monkeypatch.setattr(CryptoService, '_open', staticmethod(
+            lambda key, sealed, *args: (opened.append(len(sealed)), open_sealed(key, sealed, *args))[1]))
+        
+        with pytest.raises(InvalidTag):
+            self.crypto.decrypt_symmetric(bytes(encrypted), b"admin_test.pdf")
+        assert len(opened) == 1
+        assert self.crypto.header_matches(bytes(encrypted), b"admin_test.pdf") is True
+        assert self.crypto.header_matches(bytes(encrypted), b"admin_other.pdf") is False
+    
+    def test_large_data_uses_compatible_format(self):
+        """Тест: быстрый и потоковый пути дают совместимый формат"""
+        large_data = bytes(FAST_PATH_MAX_SIZE + 1)
+        
+        encrypted = self.crypto.encrypt_symmetric(large_data, b"aad")
+        
+        assert len(encrypted) == ENVELOPE_HEADER_SIZE + 12 + 16 + len(large_data)
+        assert self.crypto.decrypt_symmetric(encrypted, b"aad") == large_data
+
+
+class TestKeyRotation:
+    """Тесты ротации ключей"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.keyring = KeyRing({0: b"k" * 32})
+        self.crypto = CryptoService(self.keyring)
+        self.test_data = b"rotation test data"
+    
+    def test_encrypted_data_carries_key_id(self):
+        """Тест: шифротекст содержит идентификатор активного ключа"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data)
+        
+        assert self.crypto.key_id_of(encrypted) == 0
+        assert self.crypto.needs_reencryption(encrypted) is False
+    
+    def test_decrypt_after_rotation(self):
+        """Тест: после ротации старые данные расшифровываются старым ключом"""
+        old_encrypted = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        
+        new_key_id = self.crypto.rotate_key()
+        new_encrypted = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        
+        assert new_key_id == 1
+        assert self.crypto.key_id_of(new_encrypted) == 1
+        assert self.crypto.needs_reencryption(old_encrypted) is True
+        assert self.crypto.decrypt_symmetric(old_encrypted, b"aad") == self.test_data
+        assert self.crypto.decrypt_symmetric(new_encrypted, b"aad") == self.test_data
+    
+    def test_legacy_format_without_header(self):
+        """Тест: данные старого формата (без заголовка) расшифровываются ключом 0"""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        iv = b"\x01" * 12
+        sealed = AESGCM(b"k" * 32).encrypt(iv, self.test_data, None)
+        legacy = iv + sealed[-16:] + sealed[:-16]
+        
+        assert self.crypto.key_id_of(legacy) == 0
+        assert self.crypto.needs_reencryption(legacy) is True
+        assert self.crypto.decrypt_symmetric(legacy) == self.test_data
+    
+    def test_keyring_persists_rotation(self, tmp_path):
+        """Тест: ротация сохраняется на диск и видна при повторной загрузке"""
+        keyring = KeyRing.load(tmp_path, b"k" * 32)
+        key_id = keyring.rotate()
+        
+        reloaded = KeyRing.load(tmp_path, b"k" * 32)
+        
+        assert reloaded.active_id == key_id
+        assert reloaded.get(key_id) == keyring.get(key_id)
+    
+    def test_keyring_rotation_is_durable(self, tmp_path, monkeypatch):
+        """Тест: ключ записывается через fsync и os.replace раньше, чем становится активным"""
+        import os
+        from services import crypto_service
+        events = []
+        fsync, replace = os.fsync, os.replace
+        monkeypatch.setattr(crypto_service.os, 'fsync', lambda fd: (events.append('fsync'), fsync(fd)))
+        monkeypatch.setattr(crypto_service.os, 'replace',
+                            lambda src, dst: (events.append(Path(dst).name), replace(src, dst)))
+        keyring = KeyRing.load(tmp_path, b"k" * 32)
+        
+        key_id = keyring.rotate()
+        
+        assert events == ['fsync', f"{key_id}.bin", 'fsync', 'fsync', KeyRing.ACTIVE_FILE, 'fsync']
+        assert sorted(p.name for p in tmp_path.iterdir()) == [f"{key_id}.bin", KeyRing.ACTIVE_FILE]
+
+
+class TestEnvelopeEncryption:
+    """Тесты шифрования конвертом"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.crypto = CryptoService(KeyRing({0: b"k" * 32}), dek_cache_size=8)
+        self.test_data = b"envelope test data"
+    
+    def test_each_encryption_uses_new_data_key(self):
+        """Тест: у каждого шифротекста свой ключ данных"""
+        encrypted1 = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        encrypted2 = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        
+        assert self.crypto.is_envelope(encrypted1)
+        assert encrypted1[:ENVELOPE_HEADER_SIZE] != encrypted2[:ENVELOPE_HEADER_SIZE]
+    
+    def test_rewrap_header_after_rotation(self):
+        """Тест: после ротации достаточно переписать заголовок"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        self.crypto.rotate_key()
+        
+        header = self.crypto.rewrap_header(encrypted[:ENVELOPE_HEADER_SIZE], b"aad")
+        rewrapped = header + encrypted[ENVELOPE_HEADER_SIZE:]
+        self.crypto.dek_cache.clear()
+        
+        assert len(header) == ENVELOPE_HEADER_SIZE
+        assert self.crypto.key_id_of(rewrapped) == 1
+        assert self.crypto.needs_reencryption(rewrapped) is False
+        assert self.crypto.decrypt_symmetric(rewrapped, b"aad") == self.test_data
+    
+    def test_rewrap_requires_matching_associated_data(self):
+        """Тест: ключ данных привязан к associated data"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        self.crypto.dek_cache.clear()
+        
+        with pytest.raises(InvalidTag):
+            self.crypto.rewrap_header(encrypted[:ENVELOPE_HEADER_SIZE], b"other")
+    
+    def test_data_key_cache(self):
+        """Тест: повторная расшифровка использует кэш ключей данных"""
+        encrypted = self.crypto.encrypt_symmetric(self.test_data, b"aad")
+        self.crypto.dek_cache.clear()
+        
+        self.crypto.decrypt_symmetric(encrypted, b"aad")
+        self.crypto.decrypt_symmetric(encrypted, b"aad")
+        
+        assert self.crypto.dek_cache.hits == 1
+        assert len(self.crypto.dek_cache) == 1
+    
+    def test_data_key_cache_is_bounded(self):
+        """Тест: размер кэша ключей данных ограничен"""
+        for i in range(20):
+            self.crypto.encrypt_symmetric(self.test_data, str(i).encode())
+        
+        assert len(self.crypto.dek_cache) == 8
+    
+    def test_key_id_header_format_still_supported(self):
+        """Тест: данные формата версии 1 (без конверта) расшифровываются"""
+        import struct
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        header = struct.pack(">4sBI", b"VSUK", 1, 0)
+        iv = b"\x02" * 12
+        sealed = AESGCM(b"k" * 32).encrypt(iv, self.test_data, header + b"aad")
+        encrypted = header + iv + sealed[-16:] + sealed[:-16]
+        
+        assert self.crypto.needs_reencryption(encrypted) is True
+        assert self.crypto.decrypt_symmetric(encrypted, b"aad") == self.test_data
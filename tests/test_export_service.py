@@ -0,0 +1,99 @@
+"""Тесты для ExportService"""
+import pytest
+import tempfile
+import shutil
+import zipfile
+from pathlib import Path
+from io import BytesIO
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+from services.export_service import ExportService
+
+
+class TestExportService:
+    """Тесты потоковой выгрузки ZIP-архива"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.file_service = FileService(CryptoService())
+        self.file_service.upload_folder = self.temp_dir
+        self.export_service = ExportService(self.file_service, prefetch_max_size=64 * 1024, prefetch_depth=2)
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        self.export_service.executor.shutdown(wait=True)
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def save(self, filename, content, username="admin"):
+        file_obj = BytesIO(content)
+        file_obj.filename = filename
+        self.file_service.save_pdf(file_obj, username)
+    
+    def build(self, filenames, username="admin", role="admin", admins=None):
+        return zipfile.ZipFile(BytesIO(b"".join(
+            self.export_service.stream_zip(filenames, username, role, admins)
+        )))
+    
+    def test_archive_contains_decrypted_files(self):
+        """Тест: архив содержит расшифрованные документы в порядке запроса"""
+        self.save("a.pdf", b"%PDF-1.4 small")
+        self.save("b.pdf", b"%PDF-1.4 " + b"x" * 300 * 1024)
+        self.save("c.pdf", b"%PDF-1.4 another")
+        
+        archive = self.build(["c.pdf", "b.pdf", "a.pdf"])
+        
+        assert archive.testzip() is None
+        assert archive.namelist() == ["c.pdf", "b.pdf", "a.pdf"]
+        assert archive.read("a.pdf") == b"%PDF-1.4 small"
+        assert archive.read("b.pdf") == b"%PDF-1.4 " + b"x" * 300 * 1024
+    
+    def test_archive_is_streamed_in_chunks(self):
+        """Тест: архив выдаётся порциями, а не одним буфером"""
+        self.save("big.pdf", b"y" * 1024 * 1024)
+        
+        chunks = [chunk for chunk in self.export_service.stream_zip(["big.pdf"], "admin", "admin") if chunk]
+        
+        assert len(chunks) > 2
+        assert max(len(chunk) for chunk in chunks) < 1024 * 1024
+    
+    def test_missing_and_corrupted_files_are_listed(self):
+        """Тест: недоступные и повреждённые файлы перечисляются в _missing.txt"""
+        self.save("ok.pdf", b"good")
+        self.save("bad.pdf", b"bad content")
+        enc_path = self.temp_dir / "admin_bad.pdf.enc"
+        data = bytearray(enc_path.read_bytes())
+        data[-1] ^= 0xFF
+        enc_path.write_bytes(bytes(data))
+        
+        archive = self.build(["ok.pdf", "bad.pdf", "nope.pdf"])
+        
+        assert archive.namelist() == ["ok.pdf", "_missing.txt"]
+        assert archive.read("_missing.txt") == b"bad.pdf\nnope.pdf\n"
+    
+    def test_user_gets_only_accessible_files(self):
+        """Тест: пользователь получает свои файлы и файлы администраторов, но не чужие"""
+        self.save("admin.pdf", b"from admin", username="admin")
+        self.save("other.pdf", b"from other", username="other")
+        
+        archive = self.build(["admin.pdf", "other.pdf"], username="user1", role="user", admins=["admin"])
+        
+        assert archive.read("admin.pdf") == b"from admin"
+        assert archive.read("_missing.txt") == b"other.pdf\n"
+    
+    def test_path_names_are_rejected(self):
+        """Тест: имена с путями не попадают ни в поиск по хранилищу, ни в имена записей архива"""
+        self.save("a.pdf", b"data")
+        (self.temp_dir / "sub").mkdir()
+        
+        archive = self.build(["../a.pdf", "sub/../a.pdf", "/etc/passwd", "a.pdf"])
+        
+        assert archive.namelist() == ["a.pdf", "_missing.txt"]
+        assert archive.read("_missing.txt") == b"../a.pdf\nsub/../a.pdf\n/etc/passwd\n"
+    
+    def test_duplicate_names_are_exported_once(self):
+        """Тест: повторяющиеся имена в запросе попадают в архив один раз"""
+        self.save("a.pdf", b"data")
+        
+        assert self.build(["a.pdf", "a.pdf"]).namelist() == ["a.pdf"]
@@ -4,8 +4,8 @@ import tempfile
 import shutil
 from pathlib import Path
 from io import BytesIO
-from services.file_service import FileService
-from services.crypto_service import CryptoService
+from services.file_service import FileService, UploadRejected
+from services.crypto_service import CryptoService, KeyRing, ENVELOPE_HEADER_SIZE
 
 
 class TestFileService:
@@ -105,3 +105,210 @@ class TestFileService:
         assert "admin_file.pdf" in filenames
         assert "user_file.pdf" in filenames
 
+
+    def test_load_pdf_legacy_file_without_associated_data(self):
+        """Тест: файлы, зашифрованные без associated data, по-прежнему читаются"""
+        data = b"legacy pdf content"
+        compressed = self.crypto.compress(data)
+        (self.temp_dir / "testuser_old.pdf.enc").write_bytes(self.crypto.encrypt_symmetric(compressed))
+        (self.temp_dir / "testuser_old.pdf.sig").write_bytes(self.crypto.sign_data(data))
+        
+        assert self.file_service.load_pdf_for_user("old.pdf", "testuser") == data
+    
+    def test_corrupted_envelope_is_decrypted_once(self, monkeypatch):
+        """Тест: повреждённое тело файла с верным заголовком не расшифровывается повторно"""
+        data = bytes(range(256)) * 1024
+        file_obj = BytesIO(data)
+        file_obj.filename = "big.pdf"
+        safe_name = self.file_service.save_pdf(file_obj, "testuser")
+        enc_path = self.temp_dir / (safe_name + ".enc")
+        encrypted = bytearray(enc_path.read_bytes())
+        encrypted[-1] ^= 1
+        enc_path.write_bytes(bytes(encrypted))
+        body_opens = []
+        open_sealed = CryptoService._open
+        
+        def counting_open(key, sealed, associated_data, aesgcm=None):
+            if len(sealed) > ENVELOPE_HEADER_SIZE:
+                body_opens.append(len(sealed))
+            return open_sealed(key, sealed, associated_data, aesgcm)
+        monkeypatch.setattr(CryptoService, '_open', staticmethod(counting_open))
+        
+        assert self.file_service.load_pdf_for_user("big.pdf", "testuser") is None
+        assert len(body_opens) == 1
+    
+    def test_load_pdf_rejects_renamed_file(self):
+        """Тест: шифротекст, переименованный в файл другого владельца, не расшифровывается"""
+        file_obj = BytesIO(b"secret content")
+        file_obj.filename = "test.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        
+        for ext in (".enc", ".sig"):
+            (self.temp_dir / f"admin_test.pdf{ext}").rename(self.temp_dir / f"other_test.pdf{ext}")
+        
+        assert self.file_service.load_pdf_for_user("test.pdf", "other") is None
+
+    def test_rekey_file(self):
+        """Тест: перешифрование файла новым ключом"""
+        self.file_service.crypto = CryptoService(KeyRing({0: b"k" * 32}))
+        file_obj = BytesIO(b"rekey content")
+        file_obj.filename = "test.pdf"
+        safe_name = self.file_service.save_pdf(file_obj, "admin")
+        enc_path = self.temp_dir / (safe_name + ".enc")
+        mtime_before = enc_path.stat().st_mtime_ns
+        
+        assert self.file_service.rekey_file(safe_name) == 0
+        
+        self.file_service.crypto.rotate_key()
+        
+        assert self.file_service.rekey_file(safe_name) > 0
+        assert self.file_service.crypto.key_id_of(enc_path.read_bytes()) == 1
+        assert enc_path.stat().st_mtime_ns == mtime_before
+        assert self.file_service.load_pdf_for_user("test.pdf", "admin") == b"rekey content"
+    
+    def test_rekey_envelope_file_rewrites_only_header(self):
+        """Тест: для файла-конверта при смене ключа меняется только заголовок"""
+        self.file_service.crypto = CryptoService(KeyRing({0: b"k" * 32}))
+        file_obj = BytesIO(b"envelope content" * 100)
+        file_obj.filename = "test.pdf"
+        safe_name = self.file_service.save_pdf(file_obj, "admin")
+        enc_path = self.temp_dir / (safe_name + ".enc")
+        before = enc_path.read_bytes()
+        
+        self.file_service.crypto.rotate_key()
+        self.file_service.rekey_file(safe_name)
+        
+        after = enc_path.read_bytes()
+        assert after[ENVELOPE_HEADER_SIZE:] == before[ENVELOPE_HEADER_SIZE:]
+        assert after[:ENVELOPE_HEADER_SIZE] != before[:ENVELOPE_HEADER_SIZE]
+        self.file_service.crypto.dek_cache.clear()
+        assert self.file_service.load_pdf_for_user("test.pdf", "admin") == b"envelope content" * 100
+
+        assert not (self.temp_dir / (safe_name + ".enc.rekey")).exists()
+
+    def test_interrupted_header_rewrite_is_recovered(self):
+        """Тест: после сбоя при перезаписи заголовка прежний заголовок берётся из журнала"""
+        self.file_service.crypto = CryptoService(KeyRing({0: b"k" * 32}))
+        file_obj = BytesIO(b"journal content")
+        file_obj.filename = "test.pdf"
+        safe_name = self.file_service.save_pdf(file_obj, "admin")
+        enc_path = self.temp_dir / (safe_name + ".enc")
+        data = enc_path.read_bytes()
+        # Журнал записан, заголовок перезаписан наполовину
+        (self.temp_dir / (safe_name + ".enc.rekey")).write_bytes(data[:ENVELOPE_HEADER_SIZE])
+        torn = bytearray(data)
+        torn[20:ENVELOPE_HEADER_SIZE] = b"\x00" * (ENVELOPE_HEADER_SIZE - 20)
+        enc_path.write_bytes(bytes(torn))
+        self.file_service.crypto.dek_cache.clear()
+        
+        assert self.file_service.recover_interrupted_rekeys() == 1
+        
+        assert enc_path.read_bytes() == data
+        assert not (self.temp_dir / (safe_name + ".enc.rekey")).exists()
+        assert self.file_service.load_pdf_for_user("test.pdf", "admin") == b"journal content"
+
+    def test_listing_version_changes_on_save(self):
+        """Тест: версия списка меняется при загрузке файла владельцем или администратором"""
+        before = self.file_service.listing_version("user1", "user", ["admin"])
+        other_before = self.file_service.listing_version("user2", "admin")
+        
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "test.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        
+        assert self.file_service.listing_version("user1", "user", ["admin"]) != before
+        assert self.file_service.listing_version("user2", "admin") == other_before
+    
+    def test_file_validators(self):
+        """Тест: валидаторы кэширования берутся из подписи и даты изменения"""
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "test.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        
+        validators = self.file_service.file_validators("test.pdf", "user1", "user", ["admin"])
+        
+        assert validators['safe_name'] == "admin_test.pdf"
+        assert len(validators['etag']) == 64
+        assert self.file_service.file_validators("test.pdf", "user1") is None
+
+    def test_validators_follow_decoded_file(self):
+        """Тест: если свой файл повреждён и отдаётся файл администратора, валидаторы - от него"""
+        for owner, content in (("admin", b"admin copy"), ("user1", b"own copy")):
+            file_obj = BytesIO(content)
+            file_obj.filename = "test.pdf"
+            self.file_service.save_pdf(file_obj, owner)
+        enc_path = self.temp_dir / "user1_test.pdf.enc"
+        data = bytearray(enc_path.read_bytes())
+        data[-1] ^= 0xFF
+        enc_path.write_bytes(bytes(data))
+        
+        pdf_data, validators = self.file_service.load_pdf_with_validators("test.pdf", "user1", "user", ["admin"])
+        
+        assert pdf_data == b"admin copy"
+        assert validators == self.file_service.file_validators("test.pdf", "admin")
+        assert validators['etag'] != self.file_service.file_validators("test.pdf", "user1")['etag']
+
+    def test_list_user_files_cached_until_save(self):
+        """Тест: повторный запрос списка не обращается к диску до загрузки нового файла"""
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "first.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        first = self.file_service.list_user_files("user1", "user", ["admin"])
+        
+        scans = []
+        original_scan = self.file_service._scan_user_files
+        self.file_service._scan_user_files = lambda *args: scans.append(args) or original_scan(*args)
+        
+        assert self.file_service.list_user_files("user1", "user", ["admin"]) == first
+        assert scans == []
+        
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "second.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        files = self.file_service.list_user_files("user1", "user", ["admin"])
+        
+        assert len(scans) == 1
+        assert {f['filename'] for f in files} == {"first.pdf", "second.pdf"}
+    
+    def test_list_user_files_cache_respects_admin_set(self):
+        """Тест: при изменении набора администраторов список строится заново"""
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "lecture.pdf"
+        self.file_service.save_pdf(file_obj, "admin2")
+        
+        assert self.file_service.list_user_files("user1", "user", ["admin"]) == []
+        assert len(self.file_service.list_user_files("user1", "user", ["admin", "admin2"])) == 1
+    
+    def test_delete_pdf_invalidates_listing(self):
+        """Тест: удаление файла убирает его из списка и уведомляет подписчиков"""
+        events = []
+        self.file_service.add_listener(lambda event, owner, safe_name, **payload: events.append((event, safe_name)))
+        file_obj = BytesIO(b"content")
+        file_obj.filename = "test.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        assert len(self.file_service.list_user_files("admin", "admin")) == 1
+        
+        assert self.file_service.delete_pdf("test.pdf", "admin") is True
+        
+        assert self.file_service.list_user_files("admin", "admin") == []
+        assert self.file_service.delete_pdf("test.pdf", "admin") is False
+        assert events == [("saved", "admin_test.pdf"), ("deleted", "admin_test.pdf")]
+    
+    def test_save_pdf_rejects_oversized_file(self):
+        """Тест: файл больше лимита отклоняется до сжатия и шифрования"""
+        file_obj = BytesIO(b"%PDF-" + b"x" * 100)
+        file_obj.filename = "big.pdf"
+        
+        with pytest.raises(UploadRejected):
+            self.file_service.save_pdf(file_obj, "admin", max_size=16)
+        
+        assert file_obj.tell() == 17
+        assert not (self.temp_dir / "admin_big.pdf.enc").exists()
+    
+    def test_looks_like_pdf(self):
+        """Тест: проверка сигнатуры PDF не сдвигает позицию чтения"""
+        stream = BytesIO(b"\n%PDF-1.7 content")
+        
+        assert FileService.looks_like_pdf(stream)
+        assert stream.tell() == 0
+        assert not FileService.looks_like_pdf(BytesIO(b"<html>not a pdf</html>"))
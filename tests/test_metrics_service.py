@@ -0,0 +1,100 @@
+"""Тесты для метрик"""
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+from io import BytesIO
+from services.cache import LRUCache
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+from services.metrics_service import MetricsRegistry, metrics
+
+
+class TestMetricsRegistry:
+    """Тесты реестра метрик"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.registry = MetricsRegistry(enabled=True)
+        self.histogram = self.registry.histogram('test_seconds', 'Тестовая гистограмма', ('stage',),
+                                                 buckets=(0.1, 1.0))
+    
+    def test_histogram_render(self):
+        """Тест: гистограмма выводится в формате Prometheus с накопительными корзинами"""
+        self.histogram.observe(0.05, stage="read")
+        self.histogram.observe(0.5, stage="read")
+        self.histogram.observe(5, stage="read")
+        
+        output = self.registry.render()
+        
+        assert '# TYPE test_seconds histogram' in output
+        assert 'test_seconds_bucket{stage="read",le="0.1"} 1' in output
+        assert 'test_seconds_bucket{stage="read",le="1"} 2' in output
+        assert 'test_seconds_bucket{stage="read",le="+Inf"} 3' in output
+        assert 'test_seconds_count{stage="read"} 3' in output
+        assert 'test_seconds_sum{stage="read"} 5.55' in output
+    
+    def test_timer(self):
+        """Тест: таймер записывает одно наблюдение"""
+        with self.histogram.time(stage="decrypt"):
+            pass
+        
+        assert 'test_seconds_count{stage="decrypt"} 1' in self.registry.render()
+    
+    def test_disabled_registry_records_nothing(self):
+        """Тест: выключенный реестр ничего не записывает"""
+        self.registry.enabled = False
+        counter = self.registry.counter('test_total', 'Тестовый счётчик')
+        
+        with self.histogram.time(stage="read"):
+            pass
+        counter.inc()
+        
+        output = self.registry.render()
+        assert 'test_seconds_count' not in output
+        assert '\ntest_total ' not in output
+    
+    def test_cache_hit_ratio(self):
+        """Тест: метрики кэша читаются из счётчиков кэша"""
+        cache = LRUCache(4)
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("b")
+        self.registry.register_cache('dek', cache)
+        
+        output = self.registry.render()
+        
+        assert 'authvsu_cache_hits_total{cache="dek"} 1' in output
+        assert 'authvsu_cache_misses_total{cache="dek"} 1' in output
+        assert 'authvsu_cache_hit_ratio{cache="dek"} 0.5' in output
+
+
+def test_file_service_stage_metrics(monkeypatch):
+    """Тест: FileService записывает время всех этапов конвейера"""
+    monkeypatch.setattr(metrics, 'enabled', True)
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        file_service = FileService(CryptoService())
+        file_service.upload_folder = temp_dir
+        file_obj = BytesIO(b"metrics content")
+        file_obj.filename = "test.pdf"
+        file_service.save_pdf(file_obj, "admin")
+        file_service.load_pdf_for_user("test.pdf", "admin")
+        
+        output = metrics.render()
+        for stage in ("read", "decrypt", "decompress", "verify", "compress", "encrypt", "sign", "write"):
+            assert f'authvsu_file_stage_seconds_count{{stage="{stage}"}}' in output
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_metrics_endpoint(client, monkeypatch):
+    """Тест: /metrics доступен только при включённых метриках"""
+    assert client.get('/metrics').status_code == 404
+    
+    monkeypatch.setattr(metrics, 'enabled', True)
+    response = client.get('/metrics')
+    
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    assert b'authvsu_cache_hit_ratio{cache="dek"}' in response.data
@@ -0,0 +1,72 @@
+"""Тесты для ReencryptionJob"""
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+from io import BytesIO
+from services.crypto_service import CryptoService, KeyRing
+from services.file_service import FileService
+from services.reencryption_service import ReencryptionJob
+
+
+class TestReencryptionJob:
+    """Тесты фонового перешифрования"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.crypto = CryptoService(KeyRing({0: b"k" * 32}))
+        self.file_service = FileService(self.crypto)
+        self.file_service.upload_folder = self.temp_dir
+        
+        for i in range(5):
+            file_obj = BytesIO(f"content {i}".encode())
+            file_obj.filename = f"file{i}.pdf"
+            self.file_service.save_pdf(file_obj, "admin")
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def test_reencrypts_all_files(self):
+        """Тест: после ротации все файлы перешифровываются новым ключом"""
+        new_key_id = self.crypto.rotate_key()
+        job = ReencryptionJob(self.file_service, batch_size=2)
+        
+        assert job.start() is True
+        job.join(timeout=10)
+        
+        progress = job.progress()
+        assert progress['running'] is False
+        assert progress['total'] == 5
+        assert progress['migrated'] == 5
+        assert progress['failed'] == 0
+        for enc_file in self.temp_dir.glob("*.enc"):
+            assert self.crypto.key_id_of(enc_file.read_bytes()) == new_key_id
+        assert self.file_service.load_pdf_for_user("file3.pdf", "admin") == b"content 3"
+    
+    def test_skips_current_files(self):
+        """Тест: файлы, уже зашифрованные активным ключом, не переписываются"""
+        job = ReencryptionJob(self.file_service)
+        
+        job.start()
+        job.join(timeout=10)
+        
+        progress = job.progress()
+        assert progress['migrated'] == 0
+        assert progress['skipped'] == 5
+    
+    def test_reports_corrupted_files(self):
+        """Тест: повреждённый файл учитывается как ошибка, остальные мигрируют"""
+        (self.temp_dir / "admin_file0.pdf.enc").write_bytes(b"corrupted" * 10)
+        self.crypto.rotate_key()
+        job = ReencryptionJob(self.file_service)
+        
+        job.start()
+        job.join(timeout=10)
+        
+        progress = job.progress()
+        assert progress['failed'] == 1
+        assert progress['migrated'] == 4
+        assert progress['errors'][0].startswith("admin_file0.pdf")
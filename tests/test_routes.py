@@ -82,3 +82,196 @@ def test_logout(client, auth_headers):
     with client.session_transaction() as sess:
         assert sess.get('username') is None
 
+
+
+@pytest.fixture
+def uploaded_pdf(app, tmp_path, monkeypatch):
+    """Файл администратора во временном хранилище"""
+    import app as app_module
+    monkeypatch.setattr(app_module.file_service, 'upload_folder', tmp_path)
+    monkeypatch.setattr(app_module.search_index, 'path', tmp_path / ".search_index.bin")
+    file_obj = BytesIO(b"%PDF-1.4 cached content")
+    file_obj.filename = "lecture.pdf"
+    app_module.file_service.save_pdf(file_obj, "admin")
+    app_module.search_index.wait_idle()
+    return app_module.file_service
+
+
+def login_as(client, username, role):
+    with client.session_transaction() as sess:
+        sess['username'] = username
+        sess['role'] = role
+
+
+def test_view_pdf_conditional_request(client, uploaded_pdf, monkeypatch):
+    """Тест: повторный запрос с ETag получает 304 без расшифровки"""
+    login_as(client, "admin", "admin")
+    response = client.get('/view_pdf/lecture.pdf')
+    
+    assert response.status_code == 200
+    assert response.data == b"%PDF-1.4 cached content"
+    assert 'private' in response.headers['Cache-Control']
+    assert response.headers['Last-Modified']
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    
+    def fail_load(*args, **kwargs):
+        raise AssertionError("шифротекст не должен читаться")
+    for method in ('load_pdf_for_user', 'load_pdf_with_validators', 'read_stored_file', 'decode_stored_file'):
+        monkeypatch.setattr(uploaded_pdf, method, fail_load)
+    
+    response = client.get('/view_pdf/lecture.pdf', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    
+    response = client.get('/view_pdf/lecture.pdf',
+                          headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+
+def test_view_pdf_etag_changes_on_reupload(client, uploaded_pdf):
+    """Тест: после повторной загрузки файла ETag меняется"""
+    login_as(client, "admin", "admin")
+    etag = client.get('/view_pdf/lecture.pdf').headers['ETag']
+    
+    file_obj = BytesIO(b"%PDF-1.4 new content")
+    file_obj.filename = "lecture.pdf"
+    uploaded_pdf.save_pdf(file_obj, "admin")
+    
+    response = client.get('/view_pdf/lecture.pdf', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.data == b"%PDF-1.4 new content"
+
+
+def test_files_listing_etag(client, uploaded_pdf):
+    """Тест: список файлов отдаёт 304, пока не изменилась версия списка"""
+    login_as(client, "admin", "admin")
+    response = client.get('/files')
+    etag = response.headers['ETag']
+    
+    assert response.status_code == 200
+    assert client.get('/files', headers={'If-None-Match': etag}).status_code == 304
+    
+    file_obj = BytesIO(b"%PDF-1.4 another")
+    file_obj.filename = "another.pdf"
+    uploaded_pdf.save_pdf(file_obj, "admin")
+    
+    response = client.get('/files', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_delete_pdf(client, uploaded_pdf):
+    """Тест: администратор удаляет свой файл, и он пропадает из списка"""
+    login_as(client, "admin", "admin")
+    assert b"lecture.pdf" in client.get('/files').data
+    
+    response = client.post('/delete_pdf/lecture.pdf', follow_redirects=True)
+    
+    assert response.status_code == 200
+    assert "Файл lecture.pdf удалён".encode() in response.data
+    assert b"/view_pdf/lecture.pdf" not in client.get('/files').data
+    assert client.get('/view_pdf/lecture.pdf').status_code == 302
+
+
+def test_download_zip(client, uploaded_pdf):
+    """Тест: выбранные файлы выгружаются одним ZIP-архивом"""
+    import zipfile
+    login_as(client, "user1", "user")
+    
+    response = client.post('/download_zip', data={'filenames': ['lecture.pdf']})
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert 'attachment' in response.headers['Content-Disposition']
+    archive = zipfile.ZipFile(BytesIO(response.data))
+    assert archive.read('lecture.pdf') == b"%PDF-1.4 cached content"
+
+
+def test_download_zip_without_selection(client, uploaded_pdf):
+    """Тест: без выбранных файлов архив не формируется"""
+    login_as(client, "admin", "admin")
+    
+    response = client.post('/download_zip', data={})
+    
+    assert response.status_code == 302
+
+
+def test_view_pdf_is_audited(client, uploaded_pdf, tmp_path, monkeypatch):
+    """Тест: просмотр файла попадает в журнал аудита"""
+    import json
+    import app as app_module
+    from services.audit_service import AuditLog
+    audit_log = AuditLog(tmp_path / "audit.log")
+    monkeypatch.setattr(app_module, 'audit_log', audit_log)
+    login_as(client, "user1", "user")
+    
+    client.get('/view_pdf/lecture.pdf')
+    client.get('/view_pdf/missing.pdf')
+    audit_log.flush()
+    
+    events = [json.loads(line) for line in (tmp_path / "audit.log").read_text(encoding='utf-8').splitlines()]
+    assert [(e['action'], e['user'], e['file'], e['result']) for e in events] == [
+        ('view_pdf', 'user1', 'lecture.pdf', 'success'),
+        ('view_pdf', 'user1', 'missing.pdf', 'not_found'),
+    ]
+
+
+def test_upload_rejects_non_pdf_content(client, uploaded_pdf):
+    """Тест: файл с расширением .pdf, но без сигнатуры PDF, не сохраняется"""
+    login_as(client, "admin", "admin")
+    
+    response = client.post('/upload_pdf', data={'pdf': (BytesIO(b"MZ not a pdf"), 'fake.pdf')},
+                           follow_redirects=True)
+    
+    assert "Только PDF формат".encode() in response.data
+    assert not (uploaded_pdf.upload_folder / "admin_fake.pdf.enc").exists()
+
+
+def test_upload_rejected_by_content_length(client, uploaded_pdf, monkeypatch):
+    """Тест: слишком большой запрос отклоняется до разбора тела и обработки файла"""
+    import app as app_module
+    monkeypatch.setattr(app_module, 'MAX_UPLOAD_SIZE', 1024)
+    
+    def fail_save(*args, **kwargs):
+        raise AssertionError("файл не должен обрабатываться")
+    monkeypatch.setattr(uploaded_pdf, 'save_pdf', fail_save)
+    login_as(client, "admin", "admin")
+    
+    response = client.post('/upload_pdf',
+                           data={'pdf': (BytesIO(b"%PDF-1.4 " + b"x" * 100 * 1024), 'big.pdf')},
+                           follow_redirects=True)
+    
+    assert "Файл слишком большой".encode() in response.data
+
+
+def test_too_large_body_outside_upload_keeps_413(client, app, monkeypatch):
+    """Тест: слишком большое тело на других маршрутах получает 413, а не сообщение о загрузке файла"""
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 100)
+    login_as(client, "admin", "admin")
+    
+    response = client.post('/admin/create', data={'username': 'x' * 500, 'password': 'p', 'role': 'user'})
+    
+    assert response.status_code == 413
+
+
+def test_upload_spools_large_bodies_to_disk(app):
+    """Тест: файлы больше порога хранятся во временном файле, а не в памяти"""
+    import app as app_module
+    with app.test_request_context('/upload_pdf', method='POST'):
+        from flask import request
+        stream = request._get_file_stream(None, 'application/pdf', 'big.pdf')
+        stream.write(b"x" * (app_module.UPLOAD_SPOOL_THRESHOLD + 1))
+        assert stream._rolled
+        stream.close()
+
+
+def test_search(client, uploaded_pdf):
+    """Тест: поиск находит доступный файл без расшифровки документов"""
+    login_as(client, "user1", "user")
+    
+    response = client.get('/search?q=lecture')
+    
+    assert response.status_code == 200
+    assert b"/view_pdf/lecture.pdf" in response.data
+    assert b"/view_pdf/lecture.pdf" not in client.get('/search?q=missingword').data
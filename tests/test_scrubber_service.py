@@ -0,0 +1,101 @@
+"""Тесты для IntegrityScrubber"""
+import pytest
+import tempfile
+import time
+import shutil
+from pathlib import Path
+from io import BytesIO
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+from services.scrubber_service import IntegrityScrubber
+
+
+class TestIntegrityScrubber:
+    """Тесты фоновой проверки целостности"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.file_service = FileService(CryptoService())
+        self.file_service.upload_folder = self.temp_dir
+        for i in range(3):
+            file_obj = BytesIO(f"content {i}".encode())
+            file_obj.filename = f"file{i}.pdf"
+            self.file_service.save_pdf(file_obj, "admin")
+        self.scrubber = IntegrityScrubber(self.file_service)
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        self.scrubber.stop(timeout=5)
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def corrupt(self, safe_name):
+        enc_path = self.temp_dir / (safe_name + ".enc")
+        data = bytearray(enc_path.read_bytes())
+        data[-1] ^= 0xFF
+        enc_path.write_bytes(bytes(data))
+    
+    def test_scan_detects_corrupted_file(self):
+        """Тест: повреждённый файл попадает в список повреждённых"""
+        self.corrupt("admin_file1.pdf")
+        
+        stats = self.scrubber.scan_once()
+        
+        assert stats['checked'] == 3
+        assert stats['corrupted'] == 1
+        assert [f['safe_name'] for f in self.scrubber.corrupted_files()] == ["admin_file1.pdf"]
+    
+    def test_unchanged_files_are_not_rechecked(self):
+        """Тест: повторный проход проверяет только изменённые файлы"""
+        self.scrubber.scan_once()
+        
+        assert self.scrubber.scan_once()['checked'] == 0
+        
+        self.corrupt("admin_file2.pdf")
+        stats = self.scrubber.scan_once()
+        
+        assert stats['checked'] == 1
+        assert stats['corrupted'] == 1
+    
+    def test_stale_files_are_rechecked(self):
+        """Тест: файлы с устаревшей проверкой проверяются заново"""
+        self.scrubber.stale_after = 0
+        self.scrubber.scan_once()
+        
+        assert self.scrubber.scan_once()['checked'] == 3
+    
+    def test_state_is_persisted(self):
+        """Тест: состояние проверки сохраняется между запусками"""
+        self.scrubber.scan_once()
+        
+        restarted = IntegrityScrubber(self.file_service)
+        
+        assert restarted.scan_once()['checked'] == 0
+        assert restarted.summary()['verified'] == 3
+    
+    def test_deleted_files_are_forgotten(self):
+        """Тест: удалённые файлы исчезают из состояния"""
+        self.corrupt("admin_file0.pdf")
+        self.scrubber.scan_once()
+        for ext in (".enc", ".sig"):
+            (self.temp_dir / f"admin_file0.pdf{ext}").unlink()
+        
+        self.scrubber.scan_once()
+        
+        assert self.scrubber.corrupted_files() == []
+        assert self.scrubber.summary()['verified'] == 2
+    
+    def test_background_thread_runs_on_trigger(self):
+        """Тест: фоновый поток выполняет проход по запросу"""
+        scrubber = IntegrityScrubber(self.file_service, interval=3600, start_delay=3600)
+        scrubber.start()
+        scrubber.trigger()
+        
+        for _ in range(100):
+            if scrubber.last_pass is not None:
+                break
+            time.sleep(0.05)
+        scrubber.stop(timeout=5)
+        
+        assert scrubber.summary()['verified'] == 3
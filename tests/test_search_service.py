@@ -0,0 +1,307 @@
+"""Тесты для SearchIndex и извлечения текста из PDF"""
+import pytest
+import tempfile
+import shutil
+import threading
+import zlib
+from pathlib import Path
+from io import BytesIO
+from services.crypto_service import CryptoService
+from services.file_service import FileService
+from services.pdf_text import extract_pdf_text, tokenize
+from services import search_service
+from services.search_service import SEARCH_INDEX_AAD, SearchIndex
+
+
+def make_pdf(*lines: str, compress: bool = True) -> bytes:
+    """Минимальный PDF с одной страницей текста"""
+    content = ("BT /F1 12 Tf " + " ".join(f"({line}) Tj" for line in lines) + " ET").encode("latin-1")
+    if compress:
+        content = zlib.compress(content)
+        dictionary = f"<< /Length {len(content)} /Filter /FlateDecode >>".encode()
+    else:
+        dictionary = f"<< /Length {len(content)} >>".encode()
+    return (b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+            b"4 0 obj\n" + dictionary + b"\nstream\n" + content + b"\nendstream\nendobj\n%%EOF\n")
+
+
+class TestPdfText:
+    """Тесты минимального извлечения текста"""
+    
+    def test_extracts_flate_and_plain_streams(self):
+        """Тест: текст извлекается из сжатых и несжатых потоков"""
+        assert extract_pdf_text(make_pdf("Linear algebra")) == "Linear algebra"
+        assert extract_pdf_text(make_pdf("Plain text", compress=False)) == "Plain text"
+    
+    def test_tj_arrays_and_escapes(self):
+        """Тест: массивы TJ, экранирование и большие сдвиги как пробелы"""
+        content = zlib.compress(b"BT [(Ma) 20 (trix) -400 (rank)] TJ (f\\(x\\) \\101) Tj ET")
+        pdf = b"1 0 obj\n<< /Filter /FlateDecode >>\nstream\n" + content + b"\nendstream\nendobj\n"
+        
+        assert extract_pdf_text(pdf) == "Matrix rank f(x) A"
+        assert tokenize(extract_pdf_text(pdf)) == ["matrix", "rank"]
+    
+    def test_nested_and_unbalanced_strings(self):
+        """Тест: вложенные скобки сохраняются, незакрытая строка не мешает остальному тексту"""
+        content = b"BT (a (nested) b) Tj <48 65 6C6C 6F> Tj % (comment) Tj\n(tail) Tj ( ET"
+        pdf = b"1 0 obj\n<< /Length 1 >>\nstream\n" + content + b"\nendstream\nendobj\n"
+        
+        assert extract_pdf_text(pdf) == "a (nested) b Hello tail"
+    
+    def test_decompressed_size_is_limited(self):
+        """Тест: распаковка потоков ограничена бюджетом на документ"""
+        text = zlib.compress(b"BT (budget) Tj ET")
+        bomb = zlib.compress(b"BT " + b" " * (8 * 1024 * 1024) + b"(hidden) Tj ET", 9)
+        pdf = b"".join(b"%d 0 obj\n<< /Filter /FlateDecode >>\nstream\n" % number + stream + b"\nendstream\nendobj\n"
+                       for number, stream in enumerate([text, bomb, text], start=1))
+        
+        assert extract_pdf_text(pdf) == "budget hidden budget"
+        assert extract_pdf_text(pdf, max_bytes=1024 * 1024) == "budget"
+    
+    def test_non_text_streams_are_ignored(self):
+        """Тест: потоки с другими фильтрами и мусор не ломают извлечение"""
+        pdf = b"1 0 obj\n<< /Filter /DCTDecode >>\nstream\n\xff\xd8BT (x) Tj\nendstream\nendobj\n"
+        
+        assert extract_pdf_text(pdf) == ""
+        assert extract_pdf_text(b"not a pdf at all") == ""
+
+
+class TestSearchIndex:
+    """Тесты поискового индекса"""
+    
+    def setup_method(self):
+        """Инициализация перед каждым тестом"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.crypto = CryptoService()
+        self.file_service = FileService(self.crypto)
+        self.file_service.upload_folder = self.temp_dir
+        self.index_path = self.temp_dir / ".search_index.bin"
+        self.index = SearchIndex(self.crypto, self.index_path, flush_delay=0)
+        self.file_service.add_listener(self.index.on_storage_event)
+    
+    def teardown_method(self):
+        """Очистка после каждого теста"""
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir)
+    
+    def save(self, filename, data, username="admin"):
+        file_obj = BytesIO(data)
+        file_obj.filename = filename
+        self.file_service.save_pdf(file_obj, username)
+        self.index.wait_idle()
+    
+    def test_saved_file_is_searchable(self):
+        """Тест: сохранённый файл находится по словам из текста и имени"""
+        self.save("lecture1.pdf", make_pdf("Linear algebra basics"))
+        self.save("lecture2.pdf", make_pdf("Calculus and algebra"))
+        
+        assert [r['filename'] for r in self.index.search("linear ALGEBRA", "admin", "admin")] == ["lecture1.pdf"]
+        assert len(self.index.search("algebra", "admin", "admin")) == 2
+        assert self.index.search("lecture2", "admin", "admin")[0]['filename'] == "lecture2.pdf"
+        assert self.index.search("geometry", "admin", "admin") == []
+    
+    def test_indexing_runs_off_the_upload_thread(self, monkeypatch):
+        """Тест: сохранение не ждёт разбора PDF, ошибка разбора не останавливает индексацию"""
+        started = threading.Event()
+        release = threading.Event()
+        extract = search_service.extract_pdf_text
+        
+        def slow_extract(data, max_bytes):
+            if b"broken" in data:
+                raise ValueError("broken pdf")
+            started.set()
+            release.wait(5)
+            return extract(data, max_bytes)
+        monkeypatch.setattr(search_service, 'extract_pdf_text', slow_extract)
+        
+        file_obj = BytesIO(make_pdf("slow topic"))
+        file_obj.filename = "slow.pdf"
+        self.file_service.save_pdf(file_obj, "admin")
+        assert started.wait(5)
+        assert self.index.search("slow", "admin", "admin") == []
+        
+        release.set()
+        self.save("broken.pdf", b"broken")
+        self.save("next.pdf", make_pdf("next topic"))
+        
+        assert len(self.index.search("topic", "admin", "admin")) == 2
+    
+    def test_indexing_queue_is_bounded_by_bytes(self, monkeypatch):
+        """Тест: сохранение ждёт, пока в очереди индексации не освободится место"""
+        release = threading.Event()
+        extract = search_service.extract_pdf_text
+        monkeypatch.setattr(search_service, 'extract_pdf_text',
+                            lambda data, max_bytes: (release.wait(5), extract(data, max_bytes))[1])
+        self.index.max_queued_bytes = 1  # документ больше лимита принимается только в пустую очередь
+        
+        first = BytesIO(make_pdf("first topic"))
+        first.filename = "first.pdf"
+        self.file_service.save_pdf(first, "admin")
+        second_saved = threading.Event()
+        
+        def save_second():
+            self.save("second.pdf", make_pdf("second topic"))
+            second_saved.set()
+        thread = threading.Thread(target=save_second)
+        thread.start()
+        
+        assert not second_saved.wait(0.3)
+        release.set()
+        thread.join(5)
+        
+        assert second_saved.is_set()
+        assert len(self.index.search("topic", "admin", "admin")) == 2
+        assert self.index._queued_bytes == 0
+    
+    def test_search_does_not_decrypt_documents(self, monkeypatch):
+        """Тест: поиск работает только по индексу"""
+        self.save("notes.pdf", make_pdf("Probability theory"))
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("документы не должны расшифровываться")
+        monkeypatch.setattr(self.file_service, 'decode_stored_file', fail)
+        monkeypatch.setattr(self.crypto, 'decrypt_symmetric', fail)
+        
+        assert self.index.search("probability", "admin", "admin")[0]['filename'] == "notes.pdf"
+    
+    def test_access_filtering(self):
+        """Тест: пользователь находит свои файлы и файлы администраторов, но не чужие"""
+        self.save("admin.pdf", make_pdf("shared topic"), username="admin")
+        self.save("other.pdf", make_pdf("shared topic"), username="other")
+        self.save("mine.pdf", make_pdf("shared topic"), username="user1")
+        
+        results = self.index.search("shared", "user1", "user", ["admin"])
+        
+        assert sorted(r['filename'] for r in results) == ["admin.pdf", "mine.pdf"]
+        assert [r['filename'] for r in self.index.search("shared", "admin", "admin", ["admin"])] == ["admin.pdf"]
+    
+    def test_same_name_prefers_own_file(self):
+        """Тест: при совпадении имён возвращается файл, который откроет /view_pdf"""
+        self.save("doc.pdf", make_pdf("topic"), username="admin")
+        self.save("doc.pdf", make_pdf("topic"), username="user1")
+        
+        results = self.index.search("topic", "user1", "user", ["admin"])
+        
+        assert [(r['filename'], r['owner'], r['is_owner']) for r in results] == [("doc.pdf", "user1", True)]
+    
+    def test_delete_and_reupload_update_index(self):
+        """Тест: удаление убирает файл из индекса, повторная загрузка заменяет текст"""
+        self.save("doc.pdf", make_pdf("first version"))
+        self.save("doc.pdf", make_pdf("second version"))
+        
+        assert self.index.search("first", "admin", "admin") == []
+        assert len(self.index.search("second", "admin", "admin")) == 1
+        
+        self.file_service.delete_pdf("doc.pdf", "admin")
+        self.index.wait_idle()
+        
+        assert self.index.search("version", "admin", "admin") == []
+        assert len(self.index) == 0
+    
+    def test_index_is_encrypted_and_persisted(self):
+        """Тест: индекс хранится зашифрованным и загружается заново"""
+        self.save("secret.pdf", make_pdf("confidential exam answers"))
+        
+        raw = self.index_path.read_bytes()
+        assert b"confidential" not in raw
+        assert b"secret" not in raw
+        
+        reloaded = SearchIndex(self.crypto, self.index_path)
+        assert reloaded.search("exam answers", "admin", "admin")[0]['filename'] == "secret.pdf"
+    
+    def test_index_stored_files(self):
+        """Тест: файлы, загруженные до появления индекса, индексируются"""
+        file_service = FileService(self.crypto)
+        file_service.upload_folder = self.temp_dir
+        file_obj = BytesIO(make_pdf("legacy document"))
+        file_obj.filename = "old.pdf"
+        file_service.save_pdf(file_obj, "admin_x")
+        
+        assert self.index.index_stored_files(file_service, ["admin", "admin_x"]) == 1
+        assert self.index.index_stored_files(file_service, ["admin", "admin_x"]) == 0
+        
+        results = self.index.search("legacy", "admin_x", "admin")
+        assert [(r['filename'], r['owner']) for r in results] == [("old.pdf", "admin_x")]
+    
+    def test_unchanged_index_is_not_written(self):
+        """Тест: без изменений индекс на диск не пишется, после close() не пишется вовсе"""
+        self.index.save()
+        assert not self.index_path.exists()
+        
+        self.save("doc.pdf", make_pdf("topic"))
+        mtime = self.index_path.stat().st_mtime_ns
+        self.index.save()
+        assert self.index_path.stat().st_mtime_ns == mtime
+        
+        self.index.close()
+        self.index_path.unlink()
+        self.save("other.pdf", make_pdf("topic"))
+        assert not self.index_path.exists()
+    
+    def test_path_change_cancels_pending_flush(self):
+        """Тест: смена файла индекса отменяет отложенную запись по старому пути"""
+        index = SearchIndex(self.crypto, self.index_path, flush_delay=60)
+        self.file_service.add_listener(index.on_storage_event)
+        self.save("doc.pdf", make_pdf("topic"))
+        index.wait_idle()
+        assert index._flush_timer is not None
+        
+        new_path = self.temp_dir / "moved" / ".search_index.bin"
+        new_path.parent.mkdir()
+        index.path = new_path
+        assert index._flush_timer is None
+        
+        index.close()
+        assert new_path.exists()
+        assert SearchIndex(self.crypto, new_path).search("topic", "admin", "admin")
+    
+    @pytest.mark.parametrize("content", [b"garbage", b"VSUK" + bytes(100)])
+    def test_corrupt_index_starts_empty_and_is_rebuilt(self, content, caplog):
+        """Тест: повреждённый файл индекса не мешает запуску, индекс строится заново"""
+        self.save("doc.pdf", make_pdf("rebuilt topic"))
+        self.index_path.write_bytes(content)
+        
+        index = SearchIndex(self.crypto, self.index_path, flush_delay=0)
+        
+        assert len(index) == 0
+        assert "не загружен" in caplog.text
+        assert index.index_stored_files(self.file_service, ["admin"]) == 1
+        assert SearchIndex(self.crypto, self.index_path).search("rebuilt", "admin", "admin")
+    
+    def test_index_with_wrong_structure_starts_empty(self):
+        """Тест: корректно зашифрованный, но не тот JSON не приводит к исключению"""
+        payload = self.crypto.encrypt_symmetric(self.crypto.compress(b'{"doc": [1, 2]}'), SEARCH_INDEX_AAD)
+        self.index_path.write_bytes(payload)
+        
+        assert len(SearchIndex(self.crypto, self.index_path)) == 0
+    
+    def test_index_stored_files_drops_missing_files(self):
+        """Тест: записи о файлах, удалённых мимо индекса, убираются при сверке"""
+        self.save("kept.pdf", make_pdf("shared topic"))
+        self.save("gone.pdf", make_pdf("shared topic"))
+        for ext in (".enc", ".sig"):
+            (self.temp_dir / f"admin_gone.pdf{ext}").unlink()
+        
+        assert self.index.index_stored_files(self.file_service, ["admin"]) == 0
+        
+        assert [r['filename'] for r in self.index.search("shared", "admin", "admin")] == ["kept.pdf"]
+        assert SearchIndex(self.crypto, self.index_path).search("gone", "admin", "admin") == []
+    
+    def test_index_stored_files_uses_io_budget(self, monkeypatch):
+        """Тест: сверка с хранилищем списывает прочитанные байты из бюджета и прерывается при close()"""
+        file_service = FileService(self.crypto)
+        file_service.upload_folder = self.temp_dir
+        for name in ("a.pdf", "b.pdf"):
+            file_obj = BytesIO(make_pdf("stored document"))
+            file_obj.filename = name
+            file_service.save_pdf(file_obj, "admin")
+        index = SearchIndex(self.crypto, self.temp_dir / "other_index.bin", flush_delay=0, backfill_io_budget=1024)
+        consumed = []
+        monkeypatch.setattr(index.throttle, 'consume', lambda nbytes, stop_event=None: consumed.append(nbytes))
+        
+        assert index.index_stored_files(file_service, ["admin"]) == 2
+        assert consumed == [(self.temp_dir / f"admin_{name}.enc").stat().st_size for name in ("a.pdf", "b.pdf")]
+        
+        index = SearchIndex(self.crypto, self.temp_dir / "other_index.bin", flush_delay=0)
+        index.close()
+        assert index.index_stored_files(file_service, ["admin"]) == 0